@@ -0,0 +1,243 @@
+"""
+cache.py — Content-addressed cache of conversion results for server.py.
+
+Results are keyed by a BLAKE2b digest of the raw input together with the
+normalized options that affect the output, so resubmitting the same
+document with the same options skips the conversion.  Entries live in an
+in-memory LRU bounded by their total size in bytes and expire after a TTL;
+with a directory configured they are also written to disk, so they survive
+worker restarts and are shared between workers.  Disk reads and writes run
+in threads, off the event loop; the directory is kept under its own size
+limit by sweeping out expired entries, then the oldest ones.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import IO, Any
+
+
+def _size(value: Any) -> int:
+    """Approximate memory held by a cached result (a str or a dict of str)."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ResultCache:
+    """Byte-bounded LRU of conversion results with TTL and an optional disk tier.
+
+    The memory tier is used from the event loop only, so it takes no locks.
+    `max_bytes=0` disables it; entries larger than `max_bytes` are kept on
+    disk only.  The disk tier holds about `max_disk_bytes`: once this
+    process has written past that, or `sweep_interval` seconds after the
+    last sweep, expired files are deleted, then the oldest written ones.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, ttl: float | None = 3600,
+                 directory: str | None = None, max_disk_bytes: int = 1 << 30,
+                 sweep_interval: float = 600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.sweep_interval = sweep_interval
+        # key -> (monotonic expiry or None, size, value), oldest first
+        self._entries: OrderedDict[str, tuple[float | None, int, Any]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_bytes = 0  # as of the last sweep, plus this process's writes
+        self.disk_evictions = 0
+        self._disk_lock = threading.Lock()
+        self._swept = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._sweep()
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        """Build a cache from TOON_CACHE_* environment variables."""
+        env = os.environ
+        ttl = env.get("TOON_CACHE_TTL", "3600")
+        return cls(
+            max_bytes=int(env.get("TOON_CACHE_BYTES", 64 << 20)),
+            ttl=float(ttl) if ttl else None,
+            directory=env.get("TOON_CACHE_DIR") or None,
+            max_disk_bytes=int(env.get("TOON_CACHE_DIR_BYTES", 1 << 30)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or bool(self.directory)
+
+    @staticmethod
+    def _hasher(options: dict):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps(options, sort_keys=True).encode())
+        h.update(b"\0")
+        return h
+
+    @classmethod
+    def key(cls, raw: str, options: dict) -> str:
+        """Digest of the input text and the options that shape the output."""
+        h = cls._hasher(options)
+        h.update(raw.encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    @classmethod
+    def file_key(cls, fp: IO[bytes], options: dict) -> str:
+        """Like `key` for the UTF-8 input in binary file `fp`, hashed in
+        chunks; `fp` is rewound afterwards."""
+        h = cls._hasher(options)
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            h.update(chunk)
+        fp.seek(0)
+        return h.hexdigest()
+
+    async def get(self, key: str) -> Any | None:
+        """The cached result for `key`, or None."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, size, value = entry
+            if expires is None or expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._discard(key)
+        loaded = await asyncio.to_thread(self._load, key) if self.directory else None
+        if loaded is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        expires, value = loaded
+        self._remember(key, value, expires)
+        return value
+
+    async def put(self, key: str, value: Any) -> None:
+        """Cache `value` (a str, or a dict of str) under `key`."""
+        expires = time.time() + self.ttl if self.ttl else None
+        self._remember(key, value, expires)
+        if self.directory:
+            await asyncio.to_thread(self._store, key, value, expires)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_bytes": self.disk_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    def _remember(self, key: str, value: Any, expires: float | None) -> None:
+        """Keep `value` in memory until `expires` (a `time.time()` value)."""
+        size = _size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._discard(key)
+        if expires is not None:
+            expires += time.monotonic() - time.time()
+        self._entries[key] = (expires, size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, key: str) -> None:
+        self.bytes -= self._entries.pop(key)[1]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key: str) -> tuple[float | None, Any] | None:
+        """The expiry and value stored for `key`, or None."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] is not None and entry["expires"] <= time.time():
+            _remove(path)
+            return None
+        return entry["expires"], entry["value"]
+
+    def _store(self, key: str, value: Any, expires: float | None) -> None:
+        # write then rename, so other workers never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires": expires, "value": value}, f, ensure_ascii=False)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, self._path(key))
+        except (OSError, ValueError):
+            _remove(tmp)
+            return
+        with self._disk_lock:
+            self.disk_bytes += size
+            due = (self.disk_bytes > self.max_disk_bytes
+                   or time.monotonic() - self._swept > self.sweep_interval)
+        if due:
+            self._sweep()
+
+    def _sweep(self) -> None:
+        """Delete expired files, then the oldest written ones until the
+        directory holds at most `max_disk_bytes`.
+
+        Expiry is judged from the modification time, which is when the
+        entry was written.  Temporary files left by an interrupted write
+        are deleted once they are a sweep interval old.
+        """
+        with self._disk_lock:
+            self._swept = time.monotonic()
+            now = time.time()
+            files = []
+            try:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        if entry.name.endswith(".tmp"):
+                            if st.st_mtime + self.sweep_interval <= now:
+                                _remove(entry.path)
+                        elif not entry.name.endswith(".json"):
+                            continue
+                        elif self.ttl and st.st_mtime + self.ttl <= now:
+                            _remove(entry.path)
+                        else:
+                            files.append((st.st_mtime, st.st_size, entry.path))
+            except OSError:
+                return
+            total = sum(size for _, size, _ in files)
+            files.sort()
+            for _, size, path in files:
+                if total <= self.max_disk_bytes:
+                    break
+                _remove(path)
+                total -= size
+                self.disk_evictions += 1
+            self.disk_bytes = total
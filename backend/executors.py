@@ -0,0 +1,206 @@
+"""
+executors.py — Pluggable execution backends for conversions run by server.py.
+
+Modes:
+  inline   run on the event loop (lowest overhead, blocks other requests)
+  thread   run in a thread pool
+  process  payloads above a size threshold go to a warm process pool,
+           smaller ones run in the thread pool
+
+Uploaded files are converted while they are read (`run_file`); a process
+worker reads a temporary copy, so the upload never crosses the pipe.
+"""
+
+import asyncio
+import functools
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import IO
+
+from json_to_toon import Converter
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when the executor already holds `max_queue` pending tasks."""
+
+
+class ExecutorTimeout(TimeoutError):
+    """Raised when a conversion does not finish within the task timeout."""
+
+
+class ExecutorFailed(RuntimeError):
+    """Raised when a process worker died during a conversion (e.g. killed
+    for running out of memory); the pool has been replaced by then."""
+
+
+def _warm_worker() -> None:
+    """Process-pool initializer: pre-import the converter in every worker."""
+    import json_to_toon  # noqa: F401
+
+
+def _noop() -> None:
+    return None
+
+
+def _convert_file(converter: Converter, fp: IO[bytes], mode: str,
+                  roots: list[str] | None):
+    if roots:
+        return converter.json2toon_roots_file(fp, roots)
+    return converter.convert_file(fp, mode)
+
+
+def _convert_path(converter: Converter, path: str, mode: str,
+                  roots: list[str] | None):
+    with open(path, "rb") as fp:
+        return _convert_file(converter, fp, mode, roots)
+
+
+def _spool(fp: IO[bytes]) -> str:
+    """Copy binary `fp` into a new temporary file and return its path."""
+    with tempfile.NamedTemporaryFile(suffix=".upload", delete=False) as out:
+        shutil.copyfileobj(fp, out, 1 << 20)
+    return out.name
+
+
+class ConversionExecutor:
+    """Runs `Converter.convert` calls according to the configured mode."""
+
+    def __init__(self, mode: str = "inline", workers: int | None = None,
+                 process_threshold: int = 256 * 1024, max_queue: int = 64,
+                 timeout: float | None = None,
+                 max_tasks_per_child: int | None = None):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Invalid executor mode: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.process_threshold = process_threshold
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self._threads: ThreadPoolExecutor | None = None
+        self._processes: ProcessPoolExecutor | None = None
+        self._pending = 0
+
+    @classmethod
+    def from_env(cls) -> "ConversionExecutor":
+        """Build an executor from TOON_* environment variables."""
+        env = os.environ
+        timeout = env.get("TOON_TASK_TIMEOUT")
+        workers = env.get("TOON_WORKERS")
+        recycle = env.get("TOON_MAX_TASKS_PER_CHILD")
+        return cls(
+            mode=env.get("TOON_EXECUTOR", "inline"),
+            workers=int(workers) if workers else None,
+            process_threshold=int(env.get("TOON_PROCESS_THRESHOLD", 256 * 1024)),
+            max_queue=int(env.get("TOON_MAX_QUEUE", 64)),
+            timeout=float(timeout) if timeout else None,
+            max_tasks_per_child=int(recycle) if recycle else None,
+        )
+
+    def start(self) -> None:
+        """Create the pools and warm up the process workers."""
+        if self.mode in ("thread", "process"):
+            self._threads = ThreadPoolExecutor(max_workers=self.workers)
+        if self.mode == "process":
+            self._processes = self._process_pool()
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        # Recycling workers needs a non-fork start method; the pool
+        # picks "spawn" by itself when max_tasks_per_child is set.
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_warm_worker,
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+        for _ in range(self.workers):
+            pool.submit(_noop)
+        return pool
+
+    def _replace_broken(self, pool: ProcessPoolExecutor) -> None:
+        """Swap a process pool broken by a dead worker for a new one (once,
+        however many of its tasks report the failure)."""
+        if pool is self._processes:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._processes = self._process_pool()
+
+    def shutdown(self) -> None:
+        """Stop the pools without waiting for queued tasks."""
+        for pool in (self._threads, self._processes):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
+
+    def _pool_for(self, size: int):
+        if self._processes is not None and size >= self.process_threshold:
+            return self._processes
+        return self._threads
+
+    async def run(self, converter: Converter, text: str, mode: str) -> str:
+        """Convert `text` with `converter`, honouring queue depth and timeout."""
+        return await self._call(self._pool_for(len(text)), converter.convert,
+                                text, mode)
+
+    async def run_roots(self, converter: Converter, text: str,
+                        roots: list[str]) -> dict[str, str]:
+        """Convert each of `roots` out of JSON `text` in a single parse."""
+        return await self._call(self._pool_for(len(text)), converter.json2toon_roots,
+                                text, roots)
+
+    async def run_file(self, converter: Converter, fp: IO[bytes], size: int,
+                       mode: str, roots: list[str] | None = None):
+        """Like `run` (or `run_roots`, given `roots`) for binary file `fp` of
+        `size` bytes, read incrementally by the conversion."""
+        pool = self._pool_for(size)
+        if pool is not None and pool is self._processes:
+            path = await asyncio.to_thread(_spool, fp)
+            try:
+                return await self._call(pool, _convert_path, converter, path, mode, roots)
+            finally:
+                os.remove(path)
+        return await self._call(pool, _convert_file, converter, fp, mode, roots)
+
+    async def run_local(self, fn, *args):
+        """Run `fn(*args)` in this process (in the thread pool, or inline),
+        honouring queue depth and timeout: for work on state that cannot
+        move to a worker process, such as an `EditSession`."""
+        return await self._call(self._threads, fn, *args)
+
+    def _release(self, loop: asyncio.AbstractEventLoop, future) -> None:
+        """Done callback of a pool task: give its queue slot back."""
+        def release():
+            self._pending -= 1
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:  # the loop has been closed
+            pass
+
+    async def _call(self, pool, fn, *args):
+        if self._pending >= self.max_queue:
+            raise ExecutorBusy("Server is busy, try again later.")
+        if pool is None:
+            self._pending += 1
+            try:
+                return fn(*args)
+            finally:
+                self._pending -= 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = pool.submit(fn, *args)
+            # The slot is held until the task ends rather than until it is
+            # awaited: a task that timed out keeps running (neither a thread
+            # nor a process worker can be stopped), only its result is
+            # discarded.
+            self._pending += 1
+            future.add_done_callback(functools.partial(self._release, loop))
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise ExecutorTimeout("Conversion timed out.") from None
+        except BrokenProcessPool:
+            self._replace_broken(pool)
+            raise ExecutorFailed("A conversion worker stopped unexpectedly, "
+                                 "try again later.") from None
@@ -5,9 +5,19 @@ Author: Sohrab Musa
 """
 
 import argparse
+import codecs
+import collections
+import functools
+import io
+import itertools
+import operator
+import os
+import re
 import sys
+import threading
 import json
-from typing import Any
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import IO, Any, Callable, Iterable, Iterator
 from pathlib import Path
 
 try:
@@ -15,68 +25,200 @@ try:
 except ImportError:
     jsonlib = json
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 # ------------------------------
 # Helpers
 # ------------------------------
 
-def load_json(text: str) -> Any:
-    """Robust JSON loader: supports NDJSON, BOM, multiple objects."""
-    text = text.strip().lstrip("\ufeff")
-    if not text:
+_MISSING = object()
+
+
+_LEADING_RE = re.compile(r"[\s\ufeff]*")
+
+
+def load_json(text: str, fmt: str = "auto") -> Any:
+    """Robust JSON loader: supports NDJSON, JSON-seq, BOM, multiple objects.
+
+    `fmt` is one of INPUT_FORMATS; "auto" sniffs the first bytes.
+    """
+    start = _LEADING_RE.match(text).end()
+    if start == len(text):
         raise ValueError("Empty input.")
+    skipped_lines = 0
+    if start:
+        skipped_lines = text.count("\n", 0, start)
+        text = text[start:]
+    sniffed = fmt == "auto"
+    if sniffed:
+        fmt = sniff_format(text[:_SNIFF_BYTES].encode("utf-8", "surrogatepass"))
+    if fmt == "json":
+        try:
+            return jsonlib.loads(text)
+        except Exception as e:
+            if not sniffed:
+                raise ValueError(f"Invalid JSON ({e})") from None
+        # not a single document: try NDJSON or concatenated
+        fmt = "ndjson"
+    sep = "\x1e" if fmt == "json-seq" else "\n"
+    records = _iter_text_records(text, sep, skipped_lines if sep == "\n" else 0)
+    docs = list(_parse_records(records, fmt))
+    if len(docs) == 1:
+        return docs[0]
+    return docs
+
+
+def _iter_text_records(text: str, sep: str,
+                       first: int = 0) -> Iterator[tuple[int, str]]:
+    """Yield (number, record) for each `sep`-separated record, without copying
+    the whole text the way `splitlines` / `split` would."""
+    pos = 0
+    n = first
+    end = len(text)
+    while pos < end:
+        nxt = text.find(sep, pos)
+        if nxt < 0:
+            nxt = end
+        n += 1
+        yield n, text[pos:nxt]
+        pos = nxt + 1
+
+
+def _parse_records(records: Iterable[tuple[int, Any]], fmt: str) -> Iterator[Any]:
+    """Parse numbered NDJSON lines or JSON-seq records, skipping blank ones."""
+    what = "record" if fmt == "json-seq" else "line"
+    for n, rec in records:
+        rec = rec.strip()
+        if not rec:
+            continue
+        try:
+            yield jsonlib.loads(rec)
+        except Exception as e:
+            if isinstance(rec, (bytes, bytearray)):
+                rec = rec.decode("utf-8", "replace")
+            raise ValueError(f"Invalid JSON {what} {n}: {rec[:100]} ({e})") from None
+
+
+def _missing_root(path: str) -> KeyError:
+    """The error for a root path that selects nothing, whichever of the
+    selectors (`RootPath`, `select_roots`, `ToonDecoder.decode_path`) ran."""
+    return KeyError(f"Invalid root path '{path}'")
+
+
+class RootPath:
+    """A dotted root path (e.g., 'data.items.0') compiled for repeated use.
+
+    Calling it navigates a parsed document; a missing key or index raises
+    KeyError.  A `*` segment matches every key or index, and the call then
+    returns the list of matches (e.g., 'data.*.items').
+    """
+
+    __slots__ = ("path", "_steps", "_trie")
+
+    def __init__(self, path: str):
+        self.path = path
+        parts = path.split(".")
+        self._trie = _path_trie([path]) if "*" in parts else None
+        self._steps = tuple((part, _list_index(part)) for part in parts)
+
+    def __repr__(self) -> str:
+        return f"RootPath({self.path!r})"
+
+    def __call__(self, data: Any) -> Any:
+        if self._trie is not None:
+            found = {self.path: []}
+            _select_value(data, [self._trie], found)
+            return found[self.path]
+        node = data
+        try:
+            for part, index in self._steps:
+                if isinstance(node, dict):
+                    node = node[part]
+                elif isinstance(node, list) and index is not None:
+                    node = node[index]
+                else:
+                    raise KeyError(part)
+        except (KeyError, IndexError):
+            raise _missing_root(self.path) from None
+        return node
+
+    def map(self, docs: Iterable[Any]) -> Iterator[Any]:
+        """Apply the path to each of `docs`, e.g. the records of an NDJSON
+        stream."""
+        return map(self, docs)
+
+
+def _list_index(part: str) -> int | None:
     try:
-        return jsonlib.loads(text)
-    except Exception:
-        # try NDJSON or concatenated
-        docs = []
-        for line in text.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                docs.append(jsonlib.loads(line))
-            except Exception as e:
-                raise ValueError(f"Invalid JSON line: {line[:100]} ({e})")
-        if len(docs) == 1:
-            return docs[0]
-        return docs
+        return int(part)
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def compile_root(root: str) -> RootPath:
+    """The compiled `RootPath` for `root`, cached by the path string."""
+    return RootPath(root)
 
 
 def extract_root(data: Any, root: str) -> Any:
-    """Navigate nested dict using dotted path (e.g., 'data.items.0')."""
-    node = data
-    for part in root.split("."):
-        if isinstance(node, list):
-            node = node[int(part)]
-        elif isinstance(node, dict):
-            node = node.get(part)
-        else:
-            raise KeyError(f"Invalid root path at '{part}'")
-    return node
+    """Navigate nested dict using dotted path (e.g., 'data.items.0').
+
+    A missing key or index raises KeyError; see `RootPath`.
+    """
+    return compile_root(root)(data)
+
+
+# `coerce_value` decides by the first character where it can: strings that
+# cannot start a keyword or a number are returned at once, and keywords are
+# looked up among their case variants instead of lower()-ing every string.
+# Everything else goes to int()/float() as before.
+
+_KEYWORDS = {
+    "".join(cased): value
+    for word, value in (("true", True), ("false", False), ("null", None))
+    for cased in itertools.product(*((c, c.upper()) for c in word))
+}
+_KEYWORD_START = frozenset("tTfFnN")
+_NUMBER_START = frozenset("0123456789+-. \t\n\v\f\r")
+# ASCII characters that start neither a keyword nor a number, whatever follows
+_PLAIN_START = frozenset(c for c in map(chr, range(128))
+                         if c not in _KEYWORD_START and c not in _NUMBER_START
+                         and not c.isspace())
+_DIGITS = r"[0-9]+(?:_[0-9]+)*"
+_INT_RE = re.compile(rf"[+-]?{_DIGITS}")
+_FLOAT_RE = re.compile(rf"[+-]?(?:{_DIGITS}\.(?:{_DIGITS})?|\.{_DIGITS})(?:[eE][+-]?{_DIGITS})?")
+# int() may refuse longer digit strings (Python 3.11+)
+_INT_MAX_LEN = getattr(sys, "get_int_max_str_digits", lambda: 0)() or sys.maxsize
 
 
 def coerce_value(val: Any):
     """Convert strings like '123' -> int, 'true' -> bool, 'null' -> None."""
-    if isinstance(val, str):
-        low = val.lower()
-        if low == "true":
-            return True
-        if low == "false":
-            return False
-        if low == "null":
-            return None
-        try:
-            if "." in val:
-                return float(val)
-            return int(val)
-        except Exception:
-            return val
-    return val
+    if not isinstance(val, str):
+        return val
+    c = val[:1]
+    if c in _PLAIN_START:
+        return val
+    if c in _KEYWORD_START:
+        return _KEYWORDS.get(val, val)
+    try:
+        if "." in val:
+            return float(val)
+        return int(val)
+    except ValueError:
+        return val
 
 
 def coerce_data(data: Any):
-    """Recursively coerce all string values."""
+    """Recursively coerce all string values.
+
+    Returns a coerced copy; to encode coerced output without the copy, pass
+    `coerce=True` to `to_toon` / `iter_toon` instead.
+    """
     if isinstance(data, list):
         return [coerce_data(x) for x in data]
     elif isinstance(data, dict):
@@ -85,122 +227,2733 @@ def coerce_data(data: Any):
         return coerce_value(data)
 
 
+# `coerce="columns"` types the columns of a tabular array as a whole instead
+# of cell by cell, so that an id column holding "001" and "A17" stays text
+# rather than mixing ints and strings.  Anything outside a table is coerced
+# per value as with `coerce="values"` (or `coerce=True`).
+COERCE_MODES = ("values", "columns")
+
+_NULLS = frozenset(k for k, v in _KEYWORDS.items() if v is None)
+_BOOLS = {k: v for k, v in _KEYWORDS.items() if v is not None}
+# A column's distinct strings are checked against the number grammar in one
+# match over their "\0"-terminated concatenation.
+_SEP = "\0"
+_PADDING = r"[ \t\n\x0b\x0c\r]*"
+_INT_COLUMN_RE = re.compile(rf"(?:{_PADDING}{_INT_RE.pattern}{_PADDING}\0)*")
+_NUMBER_COLUMN_RE = re.compile(
+    rf"(?:{_PADDING}(?:{_FLOAT_RE.pattern}|{_INT_RE.pattern}){_PADDING}\0)*")
+
+
+def _string_kinds(strings: set) -> set:
+    """The types `coerce_value` gives `strings`, leaving out nulls and empty
+    strings (which fit every column).  Any mix that `_column_kind` leaves as
+    text may come back as just {str}, ints with floats as just {float}."""
+    strings = strings - _NULLS
+    strings.discard("")
+    if not strings:
+        return set()
+    if strings <= _BOOLS.keys():
+        return {bool}
+    text = _SEP.join(strings) + _SEP
+    if (text.isascii() and text.count(_SEP) == len(strings)
+            and max(map(len, strings)) <= _INT_MAX_LEN):
+        # neither all ints nor all numbers, and not all bools: text
+        if _INT_COLUMN_RE.fullmatch(text):
+            return {int}
+        if _NUMBER_COLUMN_RE.fullmatch(text):
+            return {float}
+        return {str}
+    kinds = set()
+    for s in strings:
+        kind = type(coerce_value(s))
+        if kind is str:
+            return {str}
+        kinds.add(kind)
+    return kinds
+
+
+def _column_kind(kinds: set) -> type:
+    """The type a column is coerced to, given the `_string_kinds` of its
+    strings: ints and floats together make floats, any other mix (or text)
+    leaves the strings alone."""
+    if kinds == {int, float}:
+        return float
+    if len(kinds) == 1:
+        return next(iter(kinds))
+    return str
+
+
+_CONVERTERS = {int: int, float: float, bool: _BOOLS.__getitem__}
+
+
+def _coerce_column(col: list, kind: type, types: set) -> list:
+    """Coerce the strings of one table column (holding `types`) to `kind`.
+
+    The distinct strings are converted in bulk and the column is mapped
+    through the results.  "null" becomes None whatever the kind; a string
+    that does not convert to `kind` (which can only happen when the kind was
+    picked from the head of a streamed table) is left as is.  Object and
+    array cells are coerced per value.
+    """
+    strings = {v for v in col if isinstance(v, str)}
+    values = dict.fromkeys(strings & _NULLS)
+    if kind in _CONVERTERS:
+        strings -= _NULLS
+        strings.discard("")
+        fits = {int, float} if kind is float else {kind}
+        if not _string_kinds(strings) <= fits:
+            strings = [s for s in strings if type(coerce_value(s)) in fits]
+        values.update(zip(strings, map(_CONVERTERS[kind], strings)))
+    if types - {str} <= _UNCOERCED:
+        return list(map(values.get, col, col)) if values else col
+    return [values.get(v, v) if isinstance(v, str) else coerce_data(v) for v in col]
+
+
+# ------------------------------
+# Streaming input
+# ------------------------------
+
+# a whole string (group 1 is the closing quote) or a bracket
+_STRUCT_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*(")?|[\[\]{}]', re.S)
+_STRING_BODY_RE = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_SCALAR_END_RE = re.compile(rb'[\s,\]}]')
+_WS = b" \t\r\n"
+_FAST_TRIES = 8
+_SKIP_WINDOW = 1 << 14
+_BRACKETS = bytes.maketrans(b"[{]}", b"(())")
+_NOT_STRUCTURAL = bytes(c for c in range(256) if c not in b'"[]{}')
+
+
+def _escaped(buf: bytes, i: int) -> bool:
+    """True if the byte at i is preceded by an odd run of backslashes."""
+    j = i
+    while j and buf[j - 1] == 0x5C:
+        j -= 1
+    return bool((i - j) % 2)
+
+
+class JsonStream:
+    """Incremental reader for a JSON document in a binary file object.
+
+    Only a window of the input is buffered: it grows to hold the value being
+    read and is trimmed once that value is consumed.  Complete values are
+    handed to `jsonlib.loads` one at a time, so an array of rows never needs
+    to be in memory at once.
+    """
+
+    def __init__(self, fp: IO[bytes], chunk_size: int = 1 << 16):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = bytearray()
+        self.pos = 0
+        self.offset = 0  # absolute input offset of buf[0]
+        self.eof = False
+        if self._skip_ws() is not None and self.buf.startswith(b"\xef\xbb\xbf", self.pos):
+            self.pos += 3
+
+    # -- buffer management -------------------------------------------------
+
+    def _fill(self) -> bool:
+        """Append one chunk to the buffer; False at end of input."""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def _compact(self) -> None:
+        """Drop consumed bytes so buffer indices start at the current value."""
+        if self.pos:
+            del self.buf[:self.pos]
+            self.offset += self.pos
+            self.pos = 0
+
+    def _error(self, msg: str, at: int | None = None) -> ValueError:
+        where = self.offset + (self.pos if at is None else at)
+        return ValueError(f"{msg} at byte {where}")
+
+    def _skip_ws(self) -> int | None:
+        """Advance past whitespace; return the next byte or None at EOF."""
+        buf = self.buf
+        while True:
+            n = len(buf)
+            pos = self.pos
+            while pos < n and buf[pos] in _WS:
+                pos += 1
+            self.pos = pos
+            if pos < n:
+                return buf[pos]
+            self._compact()
+            if not self._fill():
+                return None
+
+    # -- scanning ----------------------------------------------------------
+
+    def _string_end(self, i: int) -> int:
+        """Index just past the closing quote of a string whose body starts at i."""
+        buf = self.buf
+        while True:
+            i = _STRING_BODY_RE.match(buf, i).end()
+            if i < len(buf) and buf[i] == 0x22:  # '"'
+                return i + 1
+            if not self._fill():
+                raise self._error("Unterminated string")
+
+    def _count_brackets(self, i: int, depth: int) -> tuple[int, int] | None:
+        """Track nesting from i to the end of the buffer without a per-token
+        loop.
+
+        Escaped quotes are dropped, everything but quotes and brackets is
+        deleted, and the brackets outside strings are reduced by repeatedly
+        deleting matched pairs, which leaves the unmatched closers followed
+        by the unmatched openers.  Returns the index to resume at and the new
+        depth, or None when the value closes inside the window (the caller
+        then scans it token by token).
+        """
+        buf = self.buf
+        window = buf[i:]
+        if b"\\" in window:
+            window = window.replace(b"\\\\", b"").replace(b'\\"', b"")
+        parts = window.translate(_BRACKETS, _NOT_STRUCTURAL).split(b'"')
+        end = len(buf)
+        if not len(parts) % 2:  # resume at the string still open at the end
+            end = buf.rfind(b'"', i)
+            while _escaped(buf, end):
+                end = buf.rfind(b'"', i, end)
+        brackets = b"".join(parts[::2])
+        while b"()" in brackets:
+            brackets = brackets.replace(b"()", b"")
+        closes = brackets.count(b")")
+        if closes >= depth:
+            return None
+        return end, depth + len(brackets) - 2 * closes
+
+    def _value_end(self, discard: bool = False) -> int:
+        """Index just past the value starting at `self.pos` (not consumed).
+
+        Containers are scanned token by token; once one outgrows the
+        buffered input, each newly read chunk is bracket-counted in bulk.
+        With `discard` the bytes scanned so far are dropped while scanning,
+        so skipping a value needs no more than a window of memory.
+        """
+        self._compact()
+        buf = self.buf
+        c = buf[0]
+        if c == 0x22:  # '"'
+            return self._string_end(1)
+        if c not in b"[{":
+            while True:
+                m = _SCALAR_END_RE.search(buf, 1)
+                if m:
+                    return m.start()
+                if not self._fill():
+                    return len(buf)
+        return self._container_end(1, 1, discard)
+
+    def _container_end(self, i: int, depth: int, discard: bool) -> int:
+        """Index just past the bracket that closes `depth` open containers,
+        scanning from i."""
+        buf = self.buf
+        fresh = False  # at the start of a newly filled window
+        while True:
+            m = None
+            counted = None
+            if fresh and len(buf) - i >= _SKIP_WINDOW:
+                counted = self._count_brackets(i, depth)
+                fresh = False
+            if counted is not None:
+                i, depth = counted
+            else:
+                m = _STRUCT_RE.search(buf, i)
+                if m is None:
+                    i = len(buf)
+            if m is None:
+                if discard:
+                    del buf[:i]
+                    self.offset += i
+                    i = 0
+                if not self._fill():
+                    raise self._error("Unexpected end of JSON input", len(buf))
+                fresh = True
+                continue
+            i = m.end()
+            c = buf[m.start()]
+            if c == 0x22:
+                if m.group(1) is None:  # string runs past the buffer
+                    i = self._string_end(m.start() + 1)
+            elif c in b"[{":
+                depth += 1
+            else:
+                depth -= 1
+                if not depth:
+                    return i
+
+    # -- public API --------------------------------------------------------
+
+    def peek(self) -> str:
+        """Next significant character, or "" at end of input."""
+        c = self._skip_ws()
+        return "" if c is None else chr(c)
+
+    def _read_container(self, fill: bool = True) -> Any:
+        """Fast path for `read_value` on an object or array.
+
+        Try each closing bracket in turn as the end of the value and let the
+        parser accept or reject it; a complete prefix can only end at the
+        matching bracket.  Gives up after a few tries, so deeply nested
+        values fall back to the exact scan.  Without `fill` it also gives up
+        on values that extend past the buffered input.
+        """
+        buf = self.buf
+        close = 0x5D if buf[0] == 0x5B else 0x7D  # ']' for '[', '}' for '{'
+        i = 1
+        for _ in range(_FAST_TRIES):
+            j = buf.find(close, i)
+            while j < 0:
+                i = len(buf)
+                if not fill or not self._fill():
+                    return _MISSING
+                j = buf.find(close, i)
+            try:
+                value = jsonlib.loads(buf[:j + 1])
+            except Exception:
+                i = j + 1
+                continue
+            self.pos = j + 1
+            return value
+        return _MISSING
+
+    def read_value(self) -> Any:
+        """Parse and consume the next complete value."""
+        if self._skip_ws() is None:
+            raise self._error("Unexpected end of JSON input")
+        self._compact()
+        if self.buf[0] in b"[{":
+            value = self._read_container()
+            if value is not _MISSING:
+                return value
+        end = self._value_end()
+        try:
+            value = jsonlib.loads(self.buf[:end])
+        except Exception as e:
+            raise self._error(f"Invalid JSON value ({e})") from None
+        self.pos = end
+        return value
+
+    def _read_buffered(self) -> Any:
+        """`read_value` for a value already in the buffer; _MISSING (with
+        nothing consumed) for a container that extends past it."""
+        if self.peek() not in ("[", "{"):
+            return self.read_value()
+        self._compact()
+        return self._read_container(fill=False)
+
+    def skip_value(self) -> None:
+        """Consume the next value without building it."""
+        if self._skip_ws() is None:
+            raise self._error("Unexpected end of JSON input")
+        self.pos = self._value_end(discard=True)
+
+    def skip_rest(self) -> None:
+        """Skip the remaining members of the array or object being iterated,
+        up to and including its closing bracket."""
+        if self._skip_ws() is None:
+            raise self._error("Unexpected end of JSON input")
+        self._compact()
+        self.pos = self._container_end(0, 1, discard=True)
+
+    def _expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise self._error(f"Expected '{ch}'")
+        self.pos += 1
+
+    def iter_array(self) -> Iterator[None]:
+        """Step through an array; the caller consumes one value per step."""
+        self._expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            c = self.peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise self._error("Expected ',' or ']'", self.pos - 1)
+
+    def iter_object(self) -> Iterator[str]:
+        """Step through an object, yielding each key with the value pending."""
+        self._expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self._error("Expected object key")
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            c = self.peek()
+            self.pos += 1
+            if c == "}":
+                return
+            if c != ",":
+                raise self._error("Expected ',' or '}'", self.pos - 1)
+
+    def iter_values(self) -> Iterator[Any]:
+        """Yield the parsed elements of an array one at a time."""
+        for _ in self.iter_array():
+            yield self.read_value()
+
+    def expect_end(self) -> None:
+        if self._skip_ws() is not None:
+            raise self._error("Extra data after JSON value")
+
+    def next_records(self) -> Iterator[Any] | None:
+        """Like `expect_end`, but when a newline separates the value just
+        read from more input, return the values of the NDJSON lines that
+        follow instead of raising (a record sequence whose first record was
+        too long to be sniffed)."""
+        lines = 0
+        buf = self.buf
+        while True:
+            n = len(buf)
+            pos = self.pos
+            while pos < n and buf[pos] in _WS:
+                lines += buf[pos] == 0x0A
+                pos += 1
+            self.pos = pos
+            if pos < n:
+                break
+            self._compact()
+            if not self._fill():
+                return None
+        if not lines:
+            raise self._error("Extra data after JSON value")
+        rest = io.BufferedReader(_Replay(bytes(buf[pos:]), self.fp), self.chunk_size)
+        return _parse_records(enumerate(rest, 1 + lines), "ndjson")
+
+
+INPUT_FORMATS = ("auto", "json", "ndjson", "json-seq")
+_SNIFF_BYTES = 1 << 16
+_BOM = b"\xef\xbb\xbf"
+_RS = b"\x1e"
+
+
+def sniff_format(head: bytes) -> str:
+    """Guess "json", "ndjson" or "json-seq" from the first bytes of an input.
+
+    NDJSON is reported when the first value is complete and followed by a
+    newline and more content; anything undecidable is treated as JSON.
+    """
+    head = head.lstrip()
+    if head.startswith(_BOM):
+        head = head[3:].lstrip()
+    if head.startswith(_RS):
+        return "json-seq"
+    stream = JsonStream(io.BytesIO(head))
+    try:
+        stream.skip_value()
+    except ValueError:
+        return "json"
+    rest = stream.buf[stream.pos:].lstrip(b" \t")
+    if rest[:1] in (b"\n", b"\r") and rest.strip():
+        return "ndjson"
+    return "json"
+
+
+# NDJSON whose first record is an array too long to sniff: its elements have
+# been streamed as rows before the next record shows up
+_ARRAY_RECORD = ("JSON array followed by more records; read the input with "
+                 "input format 'ndjson'")
+
+
+def _record_path(root: str) -> bool:
+    """Whether `root` may select from the records of a record sequence."""
+    head = root.partition(".")[0]
+    return head == "*" or _list_index(head) is not None
+
+
+def sniff_stream(fp: IO[bytes]) -> tuple[IO[bytes], str]:
+    """Sniff the format of binary stream `fp` from its first `_SNIFF_BYTES`.
+
+    Returns a stream that still starts with the sniffed bytes (`fp` itself
+    if it can peek that far) and the format.  A pipe is read until the
+    window is full, however little each read returns.
+    """
+    peek = getattr(fp, "peek", None)
+    if peek is not None:
+        head = peek(_SNIFF_BYTES)
+        if len(head) >= _SNIFF_BYTES:
+            return fp, sniff_format(head[:_SNIFF_BYTES])
+    head = b""
+    while len(head) < _SNIFF_BYTES:
+        chunk = fp.read(_SNIFF_BYTES - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return io.BufferedReader(_Replay(head, fp), _SNIFF_BYTES), sniff_format(head)
+
+
+def iter_ndjson(fp: IO[bytes]) -> Iterator[Any]:
+    """Lazily parse newline-delimited JSON from binary `fp`, line by line."""
+    lines = enumerate(fp, 1)
+    first = next(lines, None)
+    if first is not None:
+        n, line = first
+        lines = itertools.chain([(n, line.removeprefix(_BOM))], lines)
+    return _parse_records(lines, "ndjson")
+
+
+def iter_json_seq(fp: IO[bytes], chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Lazily parse RFC 7464 JSON text sequences (RS-separated) from `fp`."""
+    def records():
+        n = 0
+        pieces = []
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                break
+            parts = chunk.split(_RS)
+            pieces.append(parts[0])
+            for part in parts[1:]:
+                n += 1
+                yield n, b"".join(pieces)
+                pieces = [part]
+        n += 1
+        yield n, b"".join(pieces)
+    return _parse_records(records(), "json-seq")
+
+
+class _Replay(io.RawIOBase):
+    """Raw binary reader returning `head` and then the rest of `fp`."""
+
+    def __init__(self, head: bytes, fp: IO[bytes]):
+        self._head = memoryview(head)
+        self._fp = fp
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._head:
+            return self._fp.readinto(b)
+        n = min(len(b), len(self._head))
+        b[:n] = self._head[:n]
+        self._head = self._head[n:]
+        return n
+
+
+class _Utf8Recoder(io.RawIOBase):
+    """Raw binary reader over `fp` whose invalid UTF-8 is replaced by U+FFFD,
+    decoded and re-encoded one chunk at a time."""
+
+    def __init__(self, fp: IO[bytes], chunk_size: int = 1 << 16):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._buf = b""
+        self._pos = 0
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while self._pos == len(self._buf) and not self._eof:
+            chunk = self._fp.read(self._chunk_size)
+            self._eof = not chunk
+            self._buf = self._decoder.decode(chunk, final=self._eof).encode("utf-8")
+            self._pos = 0
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+# files up to this size are decoded and parsed whole rather than streamed
+_WHOLE_INPUT = 1 << 22
+
+
+def _small_text(fp: IO[bytes]) -> str | None:
+    """The decoded text of seekable `fp` if it holds at most `_WHOLE_INPUT`
+    bytes, else None with `fp` rewound."""
+    start = fp.tell()
+    head = fp.read(_WHOLE_INPUT + 1)
+    if len(head) <= _WHOLE_INPUT:
+        return head.decode("utf-8", "replace")
+    fp.seek(start)
+    return None
+
+
+def utf8_reader(fp: IO[bytes]) -> IO[bytes]:
+    """Buffered binary view of `fp` with invalid UTF-8 replaced, as if the
+    whole input were decoded with errors="replace" and encoded again."""
+    return io.BufferedReader(_Utf8Recoder(fp), _SNIFF_BYTES)
+
+
+# Root-path selection.  The requested paths are merged into a trie, so a
+# single walk serves all of them; a `*` segment matches every key or index.
+
+class _PathNode:
+    __slots__ = ("children", "wildcard", "targets")
+
+    def __init__(self):
+        self.children: dict[str, _PathNode] = {}
+        self.wildcard: _PathNode | None = None
+        self.targets: list[str] = []  # paths that end here
+
+
+def _path_trie(paths: Iterable[str]) -> _PathNode:
+    root = _PathNode()
+    for path in paths:
+        node = root
+        for part in path.split("."):
+            if part == "*":
+                node.wildcard = node.wildcard or _PathNode()
+                node = node.wildcard
+            else:
+                node = node.children.setdefault(part, _PathNode())
+        node.targets.append(path)
+    return root
+
+
+def _step(nodes: list[_PathNode], key: str) -> list[_PathNode]:
+    return [n for node in nodes for n in (node.children.get(key), node.wildcard)
+            if n is not None]
+
+
+def _index_children(nodes: list[_PathNode]) -> dict[int, list[_PathNode]]:
+    """The children of `nodes` that can match a list item, by index.
+
+    A key is an index by the rule of `RootPath` (`_list_index`), so a
+    negative one counts from the end of the list.
+    """
+    children: dict[int, list[_PathNode]] = {}
+    for node in nodes:
+        for key, child in node.children.items():
+            index = _list_index(key)
+            if index is not None:
+                children.setdefault(index, []).append(child)
+    return children
+
+
+def _list_step(nodes: list[_PathNode], children: dict[int, list[_PathNode]],
+               index: int, length: int) -> list[_PathNode]:
+    """Like `_step` for the item at `index` of a list of `length` items."""
+    return (children.get(index, []) + children.get(index - length, [])
+            + [node.wildcard for node in nodes if node.wildcard])
+
+
+def _select_value(value: Any, nodes: list[_PathNode], found: dict[str, list]) -> None:
+    """Record the matches of `nodes` within an already parsed value."""
+    for node in nodes:
+        for path in node.targets:
+            found[path].append(value)
+    if not any(node.children or node.wildcard for node in nodes):
+        return
+    if isinstance(value, list):
+        n = len(value)
+        children = _index_children(nodes)
+        if any(node.wildcard for node in nodes):
+            indices = range(n)
+        else:
+            # each path matches at most once: visit only the named items
+            indices = sorted({i % n for i in children if -n <= i < n})
+        for i in indices:
+            nxt = _list_step(nodes, children, i, n)
+            if nxt:
+                _select_value(value[i], nxt, found)
+        return
+    if not isinstance(value, dict):
+        return
+    if any(node.wildcard for node in nodes):
+        items = value.items()
+    else:
+        # each path matches at most once: look the keys up directly
+        keys = {key for node in nodes for key in node.children}
+        items = [(key, value[key]) for key in keys if key in value]
+    for key, child in items:
+        nxt = _step(nodes, key)
+        if nxt:
+            _select_value(child, nxt, found)
+
+
+def _select_stream(stream: JsonStream, nodes: list[_PathNode],
+                   found: dict[str, list]) -> None:
+    """Record the matches of `nodes` in the next value of `stream`, parsing
+    only matched subtrees and skipping the rest unparsed."""
+    if any(node.targets for node in nodes):
+        _select_value(stream.read_value(), nodes, found)
+        return
+    c = stream.peek()
+    if c == "[":
+        children = _index_children(nodes)
+        if any(i < 0 for i in children):
+            # counted from the end: the array's length is needed
+            _select_value(stream.read_value(), nodes, found)
+            return
+        # an array past this index holds no further matches
+        last = None if any(node.wildcard for node in nodes) else max(children, default=-1)
+        wildcards = [node.wildcard for node in nodes if node.wildcard]
+        steps = (children.get(i, []) + wildcards
+                 for i, _ in enumerate(stream.iter_array()))
+    elif c == "{":
+        last = None
+        steps = (_step(nodes, key) for key in stream.iter_object())
+    else:
+        stream.skip_value()
+        return
+    for i, nxt in enumerate(steps):
+        if last is not None and i > last:
+            stream.skip_rest()
+            return
+        if not nxt:
+            stream.skip_value()
+            continue
+        # values already buffered are cheaper to parse than to walk
+        value = stream._read_buffered()
+        if value is _MISSING:
+            _select_stream(stream, nxt, found)
+        else:
+            _select_value(value, nxt, found)
+
+
+def _selected(found: dict[str, list]) -> dict[str, Any]:
+    """Wildcard paths map to all their matches, other paths to their value."""
+    selected = {}
+    for path, matches in found.items():
+        if "*" in path.split("."):
+            selected[path] = matches
+        elif matches:
+            selected[path] = matches[-1]
+        else:
+            raise _missing_root(path)
+    return selected
+
+
+def extract_roots(data: Any, roots: Iterable[str]) -> dict[str, Any]:
+    """Return the value at each dotted path in `roots` in a single walk of
+    `data` (KeyError when one is absent; `*` paths map to the list of their
+    matches)."""
+    found = {path: [] for path in roots}
+    _select_value(data, [_path_trie(found)], found)
+    return _selected(found)
+
+
+def select_roots(stream: JsonStream, roots: Iterable[str]) -> dict[str, Any]:
+    """Read the next JSON document from `stream`, returning the value at each
+    dotted path in `roots` (KeyError when one is absent).
+
+    Only the selected subtrees are parsed; everything else is skipped at the
+    byte level.  A `*` segment matches every key or index, e.g.
+    `data.*.items`; such a path maps to the list of its matches in document
+    order.
+    """
+    found = {path: [] for path in roots}
+    _select_stream(stream, [_path_trie(found)], found)
+    return _selected(found)
+
+
+def read_roots(fp: IO[bytes], roots: Iterable[str],
+               chunk_size: int = 1 << 16) -> dict[str, Any]:
+    """`select_roots` over the JSON document in binary file `fp`."""
+    stream = JsonStream(fp, chunk_size)
+    if not stream.peek():
+        raise ValueError("Empty input.")
+    selected = select_roots(stream, roots)
+    stream.expect_end()
+    return selected
+
+
 # ------------------------------
 # TOON Encoding / Decoding
 # ------------------------------
 
-def to_toon(data: Any, indent: int = 0, level: int = 0,
-            delimiter: str = ",", length_marker: bool = False) -> str:
-    """Recursively convert Python objects into TOON-style format."""
+# Scalars are formatted exactly as json.dumps(v, ensure_ascii=False) would,
+# but without building a JSONEncoder per call.  The common types dispatch on
+# their exact type to a single C-level call; everything else (nested
+# containers in cells, int/float subclasses) goes through json.dumps.
+
+_encode_str = json.encoder.encode_basestring
+_INF = float("inf")
+_TABLE_CHUNK = 4096
+_NUMPY_MIN_ROWS = 1024
+_NUMPY_SAMPLE = 256
+
+
+def _format_float(v: float) -> str:
+    if v != v:
+        return "NaN"
+    if v == _INF:
+        return "Infinity"
+    if v == -_INF:
+        return "-Infinity"
+    return float.__repr__(v)
+
+
+def _format_json(v: Any) -> str:
+    return json.dumps(v, ensure_ascii=False)
+
+
+_SCALAR_FORMATTERS = {
+    str: _encode_str,
+    int: int.__repr__,
+    float: _format_float,
+    bool: {True: "true", False: "false"}.__getitem__,
+    type(None): lambda v: "null",
+}
+
+
+def format_scalar(v: Any) -> str:
+    """JSON text for one TOON value; identical to `json.dumps(v, ensure_ascii=False)`."""
+    fmt = _SCALAR_FORMATTERS.get(type(v))
+    return fmt(v) if fmt is not None else _format_json(v)
+
+
+# Coercion (`coerce=True`) only ever turns strings into other scalars, so it
+# cannot change the layout of a document: it is applied as values are
+# formatted instead of to a copy of the whole tree beforehand.  Only values
+# of these types are left untouched by `coerce_data`.
+_UNCOERCED = frozenset([int, float, bool, type(None)])
+
+
+def _format_coerced(v: Any) -> str:
+    """`format_scalar(coerce_data(v))`; a container cell is copied on its own."""
+    return format_scalar(coerce_data(v))
+
+
+class TablePool:
+    """Worker processes that encode the rows of large tabular arrays.
+
+    The rows of a table are cut into chunks of `chunk_rows`; the parent
+    transposes each chunk into columns (the workers only see plain lists of
+    scalars, which pickle far cheaper than row dicts) and the workers format
+    and join them.  Results are consumed in submission order, with at most
+    two chunks per worker in flight, so the output is identical to serial
+    encoding.  The processes are started on first use.
+    """
+
+    def __init__(self, workers: int | None = None, chunk_rows: int = 1 << 15):
+        if chunk_rows < 1:
+            raise ValueError(f"Invalid chunk size: {chunk_rows}")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_rows = chunk_rows
+        self._executor: ProcessPoolExecutor | None = None
+
+    def __enter__(self) -> "TablePool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the worker processes, if started."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def map(self, fn: Callable[..., str], tasks: Iterable[tuple]) -> Iterator[str]:
+        """`fn(*task)` for each of `tasks` in the workers, in order."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        pending = collections.deque()
+        try:
+            for task in tasks:
+                pending.append(self._executor.submit(fn, *task))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _fingerprint(value: Any) -> bytes | str | None:
+    """Compact JSON identifying `value`'s TOON encoding, or None when there
+    is none (orjson refuses ints beyond 64 bits and non-string keys)."""
+    try:
+        fp = jsonlib.dumps(value)
+    except TypeError:
+        return None
+    if jsonlib is not json and b"null" in fp:
+        # orjson writes NaN and infinities as null too
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return fp
+
+
+class FragmentMemo:
+    """Opt-in memo of the encoded TOON of repeated subtrees.
+
+    A container value of an object member is looked up by its compact JSON
+    together with its indent level and the encoding options; on a hit the
+    stored fragment is emitted instead of encoding the subtree again.  The
+    fragments are kept in an LRU bounded by `max_bytes` (fingerprints
+    included); a subtree whose JSON exceeds an eighth of that is always
+    encoded (and streamed) as usual, though its own members are still
+    looked up.  `saved` counts the output bytes served from the memo.
+
+    A memo may be shared by threads (e.g. the outputs of `--extract`);
+    subtrees are encoded outside its lock.
+    """
+
+    def __init__(self, max_bytes: int = 16 << 20):
+        self.max_bytes = max_bytes
+        # (options, fingerprint) -> (fragment, its UTF-8 size), oldest first
+        self._fragments: collections.OrderedDict[tuple, tuple[str, int]] = \
+            collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._fragments), "bytes": self.bytes,
+                "hits": self.hits, "misses": self.misses, "saved": self.saved}
+
+    def lines(self, value: Any, options: tuple,
+              encode: Callable[[], Iterable[str]]) -> Iterator[str]:
+        """The lines `encode()` gives for `value`, or its stored fragment."""
+        fp = _fingerprint(value)
+        if fp is None or len(fp) * 8 > self.max_bytes:
+            yield from encode()
+            return
+        key = (options, fp)
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                self.saved += entry[1]
+            else:
+                self.misses += 1
+        if entry is not None:
+            yield entry[0]
+            return
+        text = "\n".join(encode())
+        size = len(text.encode("utf-8", "surrogatepass"))
+        with self._lock:
+            # another thread may have stored the same fragment meanwhile
+            old = self._fragments.pop(key, None)
+            if old is not None:
+                self.bytes -= len(fp) + old[1]
+            self._fragments[key] = (text, size)
+            self.bytes += len(fp) + size
+            while self.bytes > self.max_bytes:
+                (_, old_fp), (_, old_size) = self._fragments.popitem(last=False)
+                self.bytes -= len(old_fp) + old_size
+        yield text
+
+
+def _toon_lines(data: Any, indent: int, level: int, delimiter: str,
+                length_marker: bool, coerce: bool | str = False,
+                pool: TablePool | None = None,
+                memo: FragmentMemo | None = None) -> Iterator[str]:
+    """Yield the TOON lines for `data` in document order."""
+    fmt = _format_coerced if coerce else format_scalar
     pad = " " * (level * indent)
-    lines = []
     if isinstance(data, dict):
         for k, v in data.items():
             if isinstance(v, (dict, list)):
                 marker = ""
                 if isinstance(v, list) and length_marker:
                     marker = f"[{len(v)},]"
-                lines.append(f"{pad}{k}{marker}:")
-                lines.append(to_toon(v, indent, level + 1, delimiter, length_marker))
+                yield f"{pad}{k}{marker}:"
+                if isinstance(v, dict) and not v:
+                    # an empty object still occupies one (blank) line
+                    yield ""
+                elif memo is not None:
+                    yield from memo.lines(
+                        v, (indent, level + 1, delimiter, length_marker, coerce),
+                        functools.partial(_toon_lines, v, indent, level + 1, delimiter,
+                                          length_marker, coerce, pool, memo))
+                else:
+                    yield from _toon_lines(v, indent, level + 1, delimiter,
+                                           length_marker, coerce, pool)
             else:
-                lines.append(f"{pad}{k}: {json.dumps(v, ensure_ascii=False)}")
+                yield f"{pad}{k}: {fmt(v)}"
     elif isinstance(data, list):
         if not data:
-            lines.append(f"{pad}[]")
+            yield f"{pad}[]"
         else:
             if all(isinstance(x, dict) for x in data):
-                headers = list(data[0].keys())
-                lines.append(f"{pad}{{{delimiter.join(headers)}}}:")
-                for row in data:
-                    rowvals = [
-                        json.dumps(row.get(h, ""), ensure_ascii=False)
-                        for h in headers
-                    ]
-                    lines.append(f"{pad}{' ' * indent}{delimiter.join(rowvals)}")
+                schema = TableSchema.discover(data)
+                if coerce == "columns":
+                    schema.infer_kinds(data)
+                yield from _table_lines(data, schema, pad, indent, delimiter,
+                                        coerce, pool)
             else:
                 for x in data:
-                    lines.append(f"{pad}- {json.dumps(x, ensure_ascii=False)}")
+                    yield f"{pad}- {fmt(x)}"
     else:
-        lines.append(f"{pad}{json.dumps(data, ensure_ascii=False)}")
-    return "\n".join(lines)
+        yield f"{pad}{fmt(data)}"
+
+
+def _format_numeric_column(col: list, kind: type) -> list[str] | None:
+    """NumPy path for a column holding only ints or only floats.
+
+    The column is deduplicated on its raw 64-bit patterns (so 0.0 and -0.0
+    stay distinct), each distinct value is formatted once by the scalar
+    formatter and the texts are gathered back in column order.  Returns None
+    when the column looks too varied for this to pay off or does not fit in
+    int64.
+    """
+    sample = col[:_NUMPY_SAMPLE]
+    if len(set(sample)) * 2 > len(sample):
+        return None
+    try:
+        if kind is int:
+            bits = np.array(col, dtype=np.int64)
+        else:
+            bits = np.array(col, dtype=np.float64).view(np.int64)
+    except OverflowError:
+        return None
+    uniq, inverse = np.unique(bits, return_inverse=True)
+    if kind is float:
+        uniq = uniq.view(np.float64)
+    fmt = _SCALAR_FORMATTERS[kind]
+    texts = np.array([fmt(v) for v in uniq.tolist()], dtype=object)
+    return texts[inverse].tolist()
+
+
+def _format_column(col: list, coerce: bool | str = False,
+                   kind: type | None = None) -> list[str]:
+    """Format one table column, specialised on its value type when uniform.
+
+    With `coerce` the column's strings are coerced first: to `kind` when
+    the column has one (`coerce="columns"`), otherwise value by value.
+    """
+    types = set(map(type, col))
+    if coerce and not types <= _UNCOERCED:
+        if kind is None:
+            return list(map(_format_coerced, col))
+        col = _coerce_column(col, kind, types)
+        types = set(map(type, col))
+    if len(types) == 1:
+        kind = types.pop()
+        if np is not None and kind in (int, float) and len(col) >= _NUMPY_MIN_ROWS:
+            texts = _format_numeric_column(col, kind)
+            if texts is not None:
+                return texts
+        fmt = _SCALAR_FORMATTERS.get(kind)
+        if fmt is not None:
+            return list(map(fmt, col))
+    return list(map(format_scalar, col))
+
+
+class TableSchema:
+    """Ordered union of the keys of an array of objects.
+
+    Each distinct key order ("shape") seen in the rows gets a precomputed
+    getter that returns the row's values in header order, so encoding does
+    one lookup per row rather than one `dict.get` per header per row.
+    Missing keys are filled with "".  When every shape carries every header
+    (the usual case) columns are pulled out with one itemgetter per column.
+    """
+
+    def __init__(self):
+        self.headers: list = []
+        self._known: set = set()
+        self._getters: dict[tuple, Callable[[dict], tuple]] = {}
+        self.complete = False
+        self.frozen = False
+        # per header, the type its strings are coerced to (`coerce="columns"`)
+        self.kinds: list[type] | None = None
+
+    @classmethod
+    def discover(cls, rows: Iterable[dict]) -> "TableSchema":
+        """Collect the headers of `rows` in a single pass."""
+        schema = cls()
+        shapes = schema._getters
+        for row in rows:
+            shape = tuple(row)
+            if shape not in shapes:
+                schema._add_shape(shape)
+        known = schema._known
+        schema.complete = all(known.issubset(shape) for shape in shapes)
+        return schema
+
+    def _add_shape(self, shape: tuple) -> None:
+        new = [k for k in shape if k not in self._known]
+        if new and self.frozen:
+            raise ValueError(f"Row has keys missing from the table header: "
+                             f"{', '.join(map(str, new))}")
+        self.headers.extend(new)
+        self._known.update(new)
+        # getters depend on the final header list; built on first use
+        self._getters[shape] = None
+
+    def _make_getter(self, shape: tuple) -> Callable[[dict], tuple]:
+        headers = self.headers
+        if len(headers) == 1:
+            h = headers[0]
+            if h in shape:
+                return lambda row: (row[h],)
+            return lambda row: ("",)
+        if self._known.issubset(shape):
+            return operator.itemgetter(*headers)
+        return lambda row: tuple([row.get(h, "") for h in headers])
+
+    def row_values(self, rows: Iterable[dict]) -> list[tuple]:
+        """Return each row's values as a tuple in header order."""
+        getters = self._getters
+        out = []
+        for row in rows:
+            shape = tuple(row)
+            getter = getters.get(shape)
+            if getter is None:
+                if shape not in getters:
+                    self._add_shape(shape)
+                getter = getters[shape] = self._make_getter(shape)
+            out.append(getter(row))
+        return out
+
+    def columns(self, rows: list[dict]) -> list[list]:
+        """Transpose `rows` into one value list per header."""
+        if self.complete and not self.frozen:
+            return [list(map(operator.itemgetter(h), rows)) for h in self.headers]
+        return [list(col) for col in zip(*self.row_values(rows))]
+
+    @classmethod
+    def fixed(cls, headers: list, kinds: list | None = None) -> "TableSchema":
+        """A frozen schema with known `headers` (and column `kinds`)."""
+        schema = cls()
+        schema.headers = list(headers)
+        schema._known = set(headers)
+        schema.frozen = True
+        schema.kinds = kinds
+        return schema
+
+    def string_kinds(self, rows: list[dict]) -> list[set]:
+        """The `_string_kinds` of each column of `rows`, in header order."""
+        seen = [set() for _ in self.headers]
+        for start in range(0, len(rows), _TABLE_CHUNK):
+            chunk = rows[start:start + _TABLE_CHUNK]
+            for kinds, col in zip(seen, self.columns(chunk)):
+                if str not in kinds:
+                    kinds.update(_string_kinds({v for v in col if isinstance(v, str)}))
+        return seen
+
+    def infer_kinds(self, rows: list[dict]) -> None:
+        """Scan `rows` once and pick the type each column is coerced to.
+
+        Only the distinct strings of a column are classified; empty strings,
+        like nulls, fit every column.
+        """
+        self.kinds = list(map(_column_kind, self.string_kinds(rows)))
+
+
+def _table_lines(rows: Iterable[dict], schema: TableSchema, pad: str,
+                 indent: int, delimiter: str, coerce: bool | str = False,
+                 pool: TablePool | None = None) -> Iterator[str]:
+    """Yield a tabular block: the `{headers}:` line, then one line per row.
+
+    Rows are encoded column by column, `_TABLE_CHUNK` rows at a time:
+    the chunk is transposed into columns, each column is formatted in bulk,
+    then the formatted columns are zipped back into row lines.  With
+    `coerce="columns"` the schema's `kinds` must have been inferred.
+
+    With a `pool`, a table of at least `pool.chunk_rows` rows is encoded in
+    its worker processes instead; each item yielded is then the lines of a
+    whole chunk, already joined.
+    """
+    headers = schema.headers
+    kinds = schema.kinds if coerce == "columns" else [None] * len(headers)
+    yield f"{pad}{{{delimiter.join(headers)}}}:"
+    row_pad = f"{pad}{' ' * indent}"
+    rows = iter(rows)
+    if pool is not None and headers:
+        head = list(itertools.islice(rows, pool.chunk_rows))
+        if len(head) == pool.chunk_rows:
+            chunks = itertools.chain([head], iter(
+                lambda: list(itertools.islice(rows, pool.chunk_rows)), []))
+            yield from pool.map(_encode_rows, (
+                (schema.columns(chunk), kinds, row_pad, delimiter, coerce)
+                for chunk in chunks))
+            return
+        rows = iter(head)
+    while True:
+        chunk = list(itertools.islice(rows, _TABLE_CHUNK))
+        if not chunk:
+            return
+        if not headers:
+            yield from itertools.repeat(row_pad, len(chunk))
+            continue
+        yield from _row_lines(schema.columns(chunk), kinds, row_pad, delimiter, coerce)
+
+
+def _row_lines(columns: list[list], kinds: list, row_pad: str, delimiter: str,
+               coerce: bool | str) -> Iterator[str]:
+    """Format the `columns` of a chunk of rows and zip them into row lines."""
+    columns = [_format_column(col, coerce, kind) for col, kind in zip(columns, kinds)]
+    return map(row_pad.__add__, map(delimiter.join, zip(*columns)))
+
+
+def _encode_rows(columns: list[list], kinds: list, row_pad: str, delimiter: str,
+                 coerce: bool | str) -> str:
+    """`TablePool` task: the row lines of one chunk, joined."""
+    return "\n".join(_row_lines(columns, kinds, row_pad, delimiter, coerce))
+
+
+def scan_rows(rows: Iterable[Any], coerce: bool | str = False) -> TableSchema | None:
+    """First pass over a lazily produced array that will be read again.
+
+    Returns the frozen schema `_toon_lines` would give the whole array, with
+    the column kinds for `coerce="columns"`, or None if an element is not an
+    object.  Only `_TABLE_CHUNK` elements are held at a time.
+    """
+    rows = iter(rows)
+    headers: dict = {}
+    while chunk := list(itertools.islice(rows, _TABLE_CHUNK)):
+        if not all(isinstance(x, dict) for x in chunk):
+            return None
+        part = TableSchema.discover(chunk)
+        kinds = part.string_kinds(chunk) if coerce == "columns" else ()
+        for key, k in itertools.zip_longest(part.headers, kinds):
+            headers.setdefault(key, set()).update(k or ())
+    kinds = list(map(_column_kind, headers.values())) if coerce == "columns" else None
+    return TableSchema.fixed(list(headers), kinds)
 
 
-def toon_to_json(text: str) -> Any:
-    """Very simple parser for TOON -> JSON (best-effort)."""
-    lines = [ln.rstrip() for ln in text.splitlines() if ln.strip()]
-    root = {}
-    stack = [(0, root)]
+def _row_stream_lines(rows: Iterator[Any], indent: int, level: int,
+                      delimiter: str, coerce: bool | str = False,
+                      pool: TablePool | None = None,
+                      schema: Any = _MISSING) -> Iterator[str]:
+    """Encode a lazily produced array the way `_toon_lines` encodes a list.
+
+    Unless a `scan_rows` result is given as `schema`, the layout and the
+    table headers are decided from the first `_TABLE_CHUNK` elements:
+    objects give a tabular block, anything else a `- item` list.  Once rows
+    have been written the table cannot change, so a later non-object, or a
+    later row with keys not seen so far, is an error.
+    """
+    pad = " " * (level * indent)
+    head = list(itertools.islice(rows, _TABLE_CHUNK))
+    if schema is _MISSING:
+        schema = None
+        if all(isinstance(x, dict) for x in head):
+            schema = TableSchema.discover(head)
+            schema.frozen = True
+            if coerce == "columns":
+                # typed from the head, like the headers; see `_coerce_column`
+                schema.infer_kinds(head)
+    if not head:
+        yield f"{pad}[]"
+    elif schema is not None:
+        def checked(rows):
+            yield from head
+            for row in rows:
+                if not isinstance(row, dict):
+                    raise ValueError("Streamed array mixes objects and other "
+                                     "values; convert it without streaming.")
+                yield row
+        yield from _table_lines(checked(rows), schema, pad, indent, delimiter,
+                                coerce, pool)
+    else:
+        fmt = _format_coerced if coerce else format_scalar
+        for x in itertools.chain(head, rows):
+            yield f"{pad}- {fmt(x)}"
+
+
+def _chunk_lines(lines: Iterable[str], chunk_lines: int) -> Iterator[str]:
+    """Join lines into newline-separated chunks of up to `chunk_lines` lines."""
+    buf = []
+    sep = ""
     for line in lines:
-        stripped = line.lstrip()
-        level = len(line) - len(stripped)
-        while stack and level < stack[-1][0]:
-            stack.pop()
-        parent = stack[-1][1]
-        if ":" in stripped:
-            key, val = stripped.split(":", 1)
-            key, val = key.strip(), val.strip()
-            if not val:
-                node = {}
-                parent[key] = node
-                stack.append((level + 1, node))
+        buf.append(line)
+        if len(buf) >= chunk_lines:
+            yield sep + "\n".join(buf)
+            sep = "\n"
+            buf = []
+    if buf:
+        yield sep + "\n".join(buf)
+
+
+def iter_toon(data: Any, indent: int = 0, level: int = 0,
+              delimiter: str = ",", length_marker: bool = False,
+              chunk_lines: int = 1024, coerce: bool | str = False,
+              pool: TablePool | None = None,
+              memo: FragmentMemo | None = None) -> Iterator[str]:
+    """Yield TOON text for `data` in chunks of up to `chunk_lines` lines.
+
+    Concatenating the chunks gives exactly `to_toon(data, ...)`.  With
+    `coerce` the output equals that for `coerce_data(data)`, without the
+    coerced copy being built; `coerce="columns"` types the columns of
+    tabular arrays as a whole instead (see `COERCE_MODES`).  With a `pool`
+    large tables are encoded in its worker processes; with a `memo`
+    repeated subtrees are encoded once.
+    """
+    lines = _toon_lines(data, indent, level, delimiter, length_marker, coerce,
+                        pool, memo)
+    return _chunk_lines(lines, chunk_lines)
+
+
+def iter_toon_rows(rows: Iterable[Any], indent: int = 0, level: int = 0,
+                   delimiter: str = ",", chunk_lines: int = 1024,
+                   coerce: bool | str = False,
+                   pool: TablePool | None = None,
+                   schema: Any = _MISSING) -> Iterator[str]:
+    """Like `iter_toon` for a list, but consume its elements lazily.
+
+    Used with `JsonStream.iter_values` to encode a top-level array without
+    holding it in memory.  With `coerce="columns"` the column types are
+    picked from the first `_TABLE_CHUNK` rows, like the headers, unless the
+    `scan_rows` result of an earlier pass is given as `schema`.
+    """
+    lines = _row_stream_lines(iter(rows), indent, level, delimiter, coerce, pool,
+                              schema)
+    return _chunk_lines(lines, chunk_lines)
+
+
+def to_toon(data: Any, indent: int = 0, level: int = 0,
+            delimiter: str = ",", length_marker: bool = False,
+            coerce: bool | str = False, pool: TablePool | None = None,
+            memo: FragmentMemo | None = None) -> str:
+    """Recursively convert Python objects into TOON-style format."""
+    return "".join(iter_toon(data, indent, level, delimiter, length_marker,
+                             coerce=coerce, pool=pool, memo=memo))
+
+
+def _pointer(path: str) -> list[str]:
+    """Reference tokens of an RFC 6901 JSON Pointer."""
+    if not path:
+        return []
+    if not path.startswith("/"):
+        raise ValueError(f"Invalid JSON Pointer '{path}'")
+    return [t.replace("~1", "/").replace("~0", "~") for t in path[1:].split("/")]
+
+
+def _array_index(container: list, token: str, path: str) -> int:
+    """Array index named by `token`; "-" (and only "-") may be the length."""
+    if token == "-":
+        return len(container)
+    if not token.isdigit() or not token.isascii() or (token != "0" and token[0] == "0"):
+        raise ValueError(f"Invalid array index in '{path}'")
+    index = int(token)
+    if index > len(container):
+        raise ValueError(f"Array index out of range in '{path}'")
+    return index
+
+
+def _json_equal(a: Any, b: Any) -> bool:
+    """Equality of JSON values as "test" needs it (RFC 6902, 4.6): `==`,
+    except that true and false are not the numbers 1 and 0."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, dict):
+        return (isinstance(b, dict) and a.keys() == b.keys()
+                and all(_json_equal(v, b[k]) for k, v in a.items()))
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(map(_json_equal, a, b))
+    return a == b
+
+
+def apply_json_patch(doc: Any, patch: list[dict]) -> Any:
+    """Apply an RFC 6902 JSON Patch to `doc` and return the result.
+
+    `doc` is left untouched: only the containers on patched paths are
+    copied (each at most once per patch), and every other subtree of the
+    result is the very object found in `doc`, which is what lets
+    `IncrementalEncoder` reuse their encoding.  Raises ValueError for an
+    invalid patch or a failed "test".
+    """
+    box = [doc]
+    owned = {id(box)}
+    keep = [box]  # owned containers stay alive, so their ids stay unique
+
+    def own(parent, key):
+        child = parent[key]
+        if id(child) not in owned:
+            if isinstance(child, dict):
+                child = dict(child)
+            elif isinstance(child, list):
+                child = list(child)
+            else:
+                return child
+            parent[key] = child
+            owned.add(id(child))
+            keep.append(child)
+        return child
+
+    def locate(path: str, write: bool):
+        """The container holding `path`'s target and the key in it."""
+        parent, key = box, 0
+        for token in _pointer(path):
+            try:
+                node = own(parent, key) if write else parent[key]
+            except (KeyError, IndexError):
+                raise ValueError(f"Path '{path}' does not exist") from None
+            if isinstance(node, dict):
+                parent, key = node, token
+            elif isinstance(node, list):
+                parent, key = node, _array_index(node, token, path)
             else:
+                raise ValueError(f"Path '{path}' does not exist")
+        return parent, key
+
+    def get(path: str) -> Any:
+        parent, key = locate(path, write=False)
+        if (key not in parent) if isinstance(parent, dict) else key >= len(parent):
+            raise ValueError(f"Path '{path}' does not exist")
+        return parent[key]
+
+    def add(path: str, value: Any) -> None:
+        parent, key = locate(path, write=True)
+        if isinstance(parent, list) and parent is not box:
+            parent.insert(key, value)
+        else:
+            parent[key] = value
+
+    def remove(path: str) -> Any:
+        if not _pointer(path):
+            raise ValueError("Cannot remove the whole document")
+        value = get(path)
+        parent, key = locate(path, write=True)
+        del parent[key]
+        return value
+
+    for op in patch:
+        if not isinstance(op, dict) or not isinstance(op.get("path"), str):
+            raise ValueError(f"Invalid patch operation: {op!r}")
+        name, path = op.get("op"), op["path"]
+        if name in ("add", "replace", "test") and "value" not in op:
+            raise ValueError(f"Patch operation '{name}' needs a value")
+        if name == "add":
+            add(path, op["value"])
+        elif name == "remove":
+            remove(path)
+        elif name == "replace":
+            get(path)
+            parent, key = locate(path, write=True)
+            parent[key] = op["value"]
+        elif name in ("move", "copy"):
+            source = op.get("from")
+            if not isinstance(source, str):
+                raise ValueError(f"Patch operation '{name}' needs 'from'")
+            if name == "move":
+                if path.startswith(source + "/"):
+                    raise ValueError(f"Cannot move '{source}' into itself")
+                add(path, remove(source))
+            else:
+                value = get(source)
+                # the value is about to sit in two places, and may be an
+                # ancestor of `path`: copy everything again before any write
+                owned = {id(box)}
+                add(path, value)
+        elif name == "test":
+            if not _json_equal(get(path), op["value"]):
+                raise ValueError(f"Test failed at '{path}'")
+        else:
+            raise ValueError(f"Invalid patch operation: {name!r}")
+    return box[0]
+
+
+class _Node:
+    """An encoded subtree kept by `IncrementalEncoder`: its value and text,
+    plus the nodes of an object's container members or a table's row lines."""
+
+    __slots__ = ("value", "text", "members", "headers", "rows", "_fp")
+
+    def __init__(self, value: Any, text: str = ""):
+        self.value = value
+        self.text = text
+        self.members: dict | None = None
+        self.headers: list | None = None
+        self.rows: list[str] | None = None
+        self._fp = _MISSING
+
+    def fingerprint(self) -> bytes | str | None:
+        if self._fp is _MISSING:
+            self._fp = _fingerprint(self.value)
+        return self._fp
+
+
+class IncrementalEncoder:
+    """Encodes successive versions of a document, re-encoding only what changed.
+
+    The last version is kept as a tree of encoded fragments mirroring its
+    objects and tables.  A subtree of the new version that is the same
+    object as before (as after `apply_json_patch`), or has the same
+    fingerprint, keeps its text; a changed object is re-encoded member by
+    member, and a changed table row by row while its header stays the same
+    (with `coerce="columns"` the whole table, as its column types may
+    change).  The output always equals `to_toon(data, ...)`.  Versions must
+    not be modified in place once encoded.
+    """
+
+    def __init__(self, indent: int = 0, delimiter: str = ",",
+                 length_marker: bool = False, coerce: bool | str = False):
+        self.indent = indent
+        self.delimiter = delimiter
+        self.length_marker = length_marker
+        self.coerce = coerce
+        self._root: _Node | None = None
+        self._compare = True
+        self.reused = 0   # subtrees and rows kept by the last `encode`
+        self.encoded = 0  # subtrees and rows encoded by it
+
+    def encode(self, data: Any, patched: bool = False) -> str:
+        """TOON text for `data`, the new version of the document.
+
+        With `patched`, `data` came from `apply_json_patch` on the previous
+        version: unchanged parts are the same objects, so subtrees are not
+        compared by content.
+        """
+        self.reused = self.encoded = 0
+        self._compare = not patched
+        self._root = self._update(self._root, data, 0)
+        return self._root.text
+
+    def _update(self, node: _Node | None, value: Any, level: int) -> _Node:
+        if node is not None:
+            if value is node.value:
+                self.reused += 1
+                return node
+            if self._compare and isinstance(value, (dict, list)):
+                fp = _fingerprint(value)
+                if fp is not None and fp == node.fingerprint():
+                    node.value = value
+                    self.reused += 1
+                    return node
+            if node.members is not None and isinstance(value, dict):
+                return self._encode_object(value, level, node)
+            if node.headers is not None and _is_table(value):
+                return self._encode_table(value, level, node)
+        if isinstance(value, dict):
+            return self._encode_object(value, level, None)
+        if _is_table(value):
+            return self._encode_table(value, level, None)
+        self.encoded += 1
+        return _Node(value, "\n".join(_toon_lines(
+            value, self.indent, level, self.delimiter, self.length_marker, self.coerce)))
+
+    def _encode_object(self, value: dict, level: int, old: _Node | None) -> _Node:
+        # the lines `_toon_lines` gives an object, with container members
+        # taken from (or added to) the fragment tree
+        fmt = _format_coerced if self.coerce else format_scalar
+        pad = " " * (level * self.indent)
+        old_members = old.members if old is not None else {}
+        members = {}
+        parts = []
+        for k, v in value.items():
+            if isinstance(v, (dict, list)):
+                marker = ""
+                if isinstance(v, list) and self.length_marker:
+                    marker = f"[{len(v)},]"
+                parts.append(f"{pad}{k}{marker}:")
+                if isinstance(v, dict) and not v:
+                    parts.append("")
+                else:
+                    child = members[k] = self._update(old_members.get(k), v, level + 1)
+                    parts.append(child.text)
+            else:
+                parts.append(f"{pad}{k}: {fmt(v)}")
+        node = _Node(value, "\n".join(parts))
+        node.members = members
+        return node
+
+    def _encode_table(self, value: list, level: int, old: _Node | None) -> _Node:
+        schema = TableSchema.discover(value)
+        if self.coerce == "columns":
+            schema.infer_kinds(value)
+        pad = " " * (level * self.indent)
+
+        def lines(rows):
+            encoded = _table_lines(rows, schema, pad, self.indent, self.delimiter, self.coerce)
+            return encoded, next(encoded)
+
+        if (old is not None and old.headers == schema.headers
+                and self.coerce != "columns"):
+            # rows are matched by identity, so inserted or removed rows
+            # do not shift the rest out of place
+            kept = {id(row): line for row, line in zip(old.value, old.rows)}
+            rows = [kept.get(id(row)) for row in value]
+            changed = [row for row, line in zip(value, rows) if line is None]
+            fresh, header = lines(changed)
+            rows = [next(fresh) if line is None else line for line in rows]
+            self.reused += len(value) - len(changed)
+            self.encoded += len(changed)
+        else:
+            fresh, header = lines(value)
+            rows = list(fresh)
+            self.encoded += len(value)
+        node = _Node(value, "\n".join([header, *rows]))
+        node.headers = schema.headers
+        node.rows = rows
+        return node
+
+
+def _is_table(value: Any) -> bool:
+    """Whether `value` is encoded as a tabular block."""
+    return isinstance(value, list) and bool(value) and all(isinstance(x, dict) for x in value)
+
+
+# Decoding works on (indent, text, lineno) lines.  A block is the run of
+# lines indented deeper than its parent line; the first line of a block
+# tells its kind: `[]`, a `{a,b}:` table header, `- item` entries or
+# `key: value` / `key[N,]:` members.  Values are JSON text, except that a
+# member value which is not valid JSON is kept as a raw string.
+
+_KEY_LINE_RE = re.compile(r"(.*?)(?:\[(\d+),\])?:(?: (.*))?$", re.S)
+
+
+@functools.lru_cache(maxsize=None)
+def _cell_re(delimiter: str) -> re.Pattern:
+    """Pattern matching one row cell: JSON strings may contain `delimiter`."""
+    d = re.escape(delimiter)
+    return re.compile(rf'(?:"(?:[^"\\]|\\.)*"|[^"{d}])+')
+
+
+# orjson reads integers beyond 64 bits as floats: text holding a digit run
+# that long (19 digits may already be below -2**63) goes to stdlib json.
+# Runs are found by mapping every digit to "0", which is much faster than
+# a regex over large batches.
+_WIDE_INT_DIGITS = 19
+_ZERO_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+
+
+def _has_wide_int(text: str) -> bool:
+    return (len(text) >= _WIDE_INT_DIGITS
+            and b"0" * _WIDE_INT_DIGITS
+            in text.encode("utf-8", "surrogatepass").translate(_ZERO_DIGITS))
+
+
+def _loads(text: str) -> Any:
+    """Parse JSON text; stdlib json is the fallback for NaN/Infinity and for
+    integers too wide for orjson."""
+    if _has_wide_int(text):
+        return json.loads(text)
+    try:
+        return jsonlib.loads(text)
+    except Exception:
+        return json.loads(text)
+
+
+def _loads_lenient(text: str) -> Any:
+    try:
+        return _loads(text)
+    except ValueError:
+        return text
+
+
+def _detect_delimiter(header: str) -> str:
+    for d in ("\t", "|"):
+        if d in header:
+            return d
+    return ","
+
+
+class _ToonReader:
+    """Line source for the decoder with lookahead and pushback.
+
+    Blank lines are skipped.  Lines are returned as (indent, text, lineno)
+    with the indentation and trailing whitespace removed.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = enumerate(lines, 1)
+        self._ahead = []  # stack of lines read but not consumed
+
+    def _read(self) -> tuple[int, str, int] | None:
+        for lineno, line in self._lines:
+            body = line.lstrip(" ")
+            text = body.rstrip()
+            if text:
+                return len(line) - len(body), text, lineno
+        return None
+
+    def peek(self) -> tuple[int, str, int] | None:
+        if not self._ahead:
+            line = self._read()
+            if line is None:
+                return None
+            self._ahead.append(line)
+        return self._ahead[-1]
+
+    def pop(self) -> tuple[int, str, int] | None:
+        return self._ahead.pop() if self._ahead else self._read()
+
+    def unread(self, line: tuple[int, str, int]) -> None:
+        self._ahead.append(line)
+
+    def skip_deeper(self, indent: int) -> None:
+        """Drop every line indented deeper than `indent`, tokenizing nothing
+        but the line that ends the run."""
+        ahead = self._ahead
+        while ahead and ahead[-1][0] > indent:
+            ahead.pop()
+        if ahead:
+            return
+        for lineno, line in self._lines:
+            body = line.lstrip(" ")
+            if body.isspace() or not body:
+                continue
+            if len(line) - len(body) <= indent:
+                ahead.append((len(line) - len(body), body.rstrip(), lineno))
+                return
+
+    def skip_lines(self, n: int) -> None:
+        """Drop the next `n` non-blank lines unread (used with length
+        markers); blank lines in between are skipped as by `pop`."""
+        ahead = self._ahead
+        while n and ahead:
+            ahead.pop()
+            n -= 1
+        if n:
+            for _, line in self._lines:
+                if line and not line.isspace():
+                    n -= 1
+                    if not n:
+                        return
+
+
+class _JsonWriter:
+    """Formatting rules of `json.dumps(..., indent, ensure_ascii)`, applied
+    piecewise so JSON can be written while the document is decoded."""
+
+    def __init__(self, indent: int | None, ensure_ascii: bool):
+        self.indent = indent
+        self.encoder = json.JSONEncoder(ensure_ascii=ensure_ascii, indent=indent)
+        self.item_sep = ", " if indent is None else ","
+
+    def newline(self, level: int) -> str:
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def value(self, v: Any, level: int) -> str:
+        """`v` as JSON, with nested lines shifted to nesting `level`."""
+        text = self.encoder.encode(v)
+        if level and self.indent and "\n" in text:
+            text = text.replace("\n", self.newline(level))
+        return text
+
+
+class ToonDecoder:
+    """Single-pass TOON decoder.
+
+    Inverse of `to_toon` for output written with a non-zero indent.
+    `delimiter` is the table delimiter; by default it is detected from each
+    table header.  `decode` builds the object tree; `iter_json` writes the
+    same document as JSON text while reading, holding at most one table
+    batch in memory.
+    """
+
+    def __init__(self, lines: Iterable[str], delimiter: str | None = None):
+        self.reader = _ToonReader(lines)
+        self.delimiter = delimiter
+
+    def _error(self, msg: str, lineno: int) -> ValueError:
+        return ValueError(f"{msg} (line {lineno})")
+
+    # -- document level ----------------------------------------------------
+
+    def _top_scalar(self) -> Any:
+        """A lone line that is valid JSON is a top-level scalar."""
+        r = self.reader
+        first = r.pop()
+        if r.peek() is None and first[1] != "[]":
+            try:
+                return _loads(first[1])
+            except ValueError:
+                pass
+        r.unread(first)
+        return _MISSING
+
+    def _expect_end(self) -> None:
+        extra = self.reader.peek()
+        if extra is not None:
+            raise self._error("Unexpected indentation", extra[2])
+
+    def decode(self) -> Any:
+        """Decode the whole document."""
+        if self.reader.peek() is None:
+            return {}
+        value = self._top_scalar()
+        if value is _MISSING:
+            value = self.block(-1)
+            self._expect_end()
+        return value
+
+    def decode_path(self, path: str) -> Any:
+        """Decode only the value at dotted `path` (e.g. 'data.items.0').
+
+        Sibling blocks are skipped without being tokenized; blocks carrying
+        a `[N,]` length marker are skipped by line count.  Reading stops
+        once the value is found.
+        """
+        if self.reader.peek() is None:
+            return extract_root({}, path)
+        value = self._top_scalar()
+        if value is not _MISSING:
+            return extract_root(value, path)
+        try:
+            return self._select(-1, path.split("."), None)
+        except KeyError:
+            raise _missing_root(path) from None
+
+    def iter_json(self, indent: int | None = None,
+                  ensure_ascii: bool = False) -> Iterator[str]:
+        """Yield the document as JSON text, equal to `json.dumps(self.decode(),
+        indent=indent, ensure_ascii=ensure_ascii)`, while it is being read."""
+        w = _JsonWriter(indent, ensure_ascii)
+        if self.reader.peek() is None:
+            yield "{}"
+            return
+        value = self._top_scalar()
+        if value is not _MISSING:
+            yield w.value(value, 0)
+            return
+        yield from self._iter_block(-1, 0, w)
+        self._expect_end()
+
+    # -- blocks ------------------------------------------------------------
+
+    def _kind(self, parent: int) -> str | None:
+        """Kind of the block indented deeper than `parent`; None if empty."""
+        nxt = self.reader.peek()
+        if nxt is None or nxt[0] <= parent:
+            return None
+        text = nxt[1]
+        if text == "[]":
+            return "empty"
+        if text.startswith("- "):
+            return "items"
+        if text[0] == "{" and text.endswith("}:"):
+            return "table"
+        if ":" not in text:
+            return "scalar"
+        return "members"
+
+    def _count_error(self, count: int, got: int, lineno: int) -> ValueError:
+        return self._error(f"Length marker [{count},] does not match {got} entries",
+                           lineno)
+
+    def block(self, parent: int, count: int | None = None, lineno: int = 0) -> Any:
+        """Decode the value made of the lines indented deeper than `parent`.
+
+        `count` is the `[N,]` length marker of the member line (at `lineno`)
+        that introduced the block; lists are preallocated to that size and
+        checked against it.
+        """
+        kind = self._kind(parent)
+        if kind is None:
+            if count:
+                raise self._count_error(count, 0, lineno)
+            return {}
+        if kind == "empty":
+            self.reader.pop()
+            if count:
+                raise self._count_error(count, 0, lineno)
+            return []
+        if kind == "scalar":
+            return _loads_lenient(self.reader.pop()[1])
+        indent = self.reader.peek()[0]
+        if kind == "items":
+            batches = ([_loads_lenient(t)] for t in self._item_texts(indent))
+            return self._collect(batches, count, lineno)
+        if kind == "table":
+            return self._collect(self._table_batches(indent, count), count, lineno)
+        out = {}
+        for key, cnt, value, ln in self._member_lines(indent):
+            out[key] = self.block(indent, cnt, ln) if value is None else _loads_lenient(value)
+        return out
+
+    def _collect(self, batches: Iterable[list], count: int | None, lineno: int) -> list:
+        """Concatenate list batches, into a list preallocated to `count`."""
+        if count is None:
+            out = []
+            for batch in batches:
+                out += batch
+            return out
+        out = [None] * count
+        n = 0
+        for batch in batches:
+            end = n + len(batch)
+            if end > count:
+                raise self._count_error(count, end, lineno)
+            out[n:end] = batch
+            n = end
+        if n != count:
+            raise self._count_error(count, n, lineno)
+        return out
+
+    def _iter_block(self, parent: int, level: int, w: "_JsonWriter",
+                    count: int | None = None, lineno: int = 0) -> Iterator[str]:
+        """Streaming counterpart of `block`: yield the block as JSON text."""
+        kind = self._kind(parent)
+        if kind is None or kind == "empty":
+            if count:
+                raise self._count_error(count, 0, lineno)
+            if kind == "empty":
+                self.reader.pop()
+            yield "{}" if kind is None else "[]"
+            return
+        if kind == "scalar":
+            yield w.value(_loads_lenient(self.reader.pop()[1]), level)
+            return
+        indent = self.reader.peek()[0]
+        inner = w.newline(level + 1)
+        if kind == "items":
+            sep = "["
+            n = 0
+            for text in self._item_texts(indent):
+                yield sep + inner + w.value(_loads_lenient(text), level + 1)
+                sep = w.item_sep
+                n += 1
+            if count is not None and n != count:
+                raise self._count_error(count, n, lineno)
+            yield w.newline(level) + "]"
+        elif kind == "table":
+            sep = "["
+            n = 0
+            for batch in self._table_batches(indent, count):
+                yield sep + w.item_sep.join(
+                    [inner + w.value(row, level + 1) for row in batch])
+                sep = w.item_sep
+                n += len(batch)
+            if count is not None and n != count:
+                raise self._count_error(count, n, lineno)
+            yield "[]" if sep == "[" else w.newline(level) + "]"
+        else:
+            sep = "{"
+            for key, cnt, value, ln in self._member_lines(indent):
+                yield sep + inner + w.value(key, 0) + ": "
+                if value is None:
+                    yield from self._iter_block(indent, level + 1, w, cnt, ln)
+                else:
+                    yield w.value(_loads_lenient(value), level + 1)
+                sep = w.item_sep
+            yield w.newline(level) + "}"
+
+    def _select(self, parent: int, parts: list[str], count: int | None) -> Any:
+        """Decode only the value at `parts` below the block deeper than `parent`."""
+        kind = self._kind(parent)
+        part, rest = parts[0], parts[1:]
+        if kind not in ("members", "items", "table") or (
+                kind != "members" and not part.isdigit()):
+            return extract_root(self.block(parent, count), ".".join(parts))
+        indent = self.reader.peek()[0]
+        if kind == "members":
+            for key, cnt, value, ln in self._member_lines(indent):
+                if key == part:
+                    if value is not None:
+                        return extract_root(_loads_lenient(value), ".".join(rest)) \
+                            if rest else _loads_lenient(value)
+                    if not rest:
+                        return self.block(indent, cnt, ln)
+                    return self._select(indent, rest, cnt)
+                if value is None:
+                    self._skip_block(indent, cnt)
+            raise KeyError(part)
+        index = int(part)
+        if count is not None and index >= count:
+            raise KeyError(part)
+        if kind == "items":
+            texts = self._item_texts(indent)
+            if count is not None:
+                self.reader.skip_lines(index)
+            else:
+                texts = itertools.islice(texts, index, None)
+            value = next(map(_loads_lenient, texts), _MISSING)
+        else:
+            value = self._table_row(indent, index, count)
+        if value is _MISSING:
+            raise KeyError(part)
+        return extract_root(value, ".".join(rest)) if rest else value
+
+    def _table_row(self, indent: int, index: int, count: int | None) -> Any:
+        """Decode row `index` of the table at `indent`, skipping the others."""
+        r = self.reader
+        header = r.pop()[1][1:-2]
+        delimiter = self.delimiter or _detect_delimiter(header)
+        headers = header.split(delimiter) if header else []
+        if not headers:
+            return {} if count is not None and index < count else _MISSING
+        if count is not None:
+            r.skip_lines(index)
+        else:
+            for _ in range(index):
+                nxt = r.peek()
+                if nxt is None or nxt[0] <= indent:
+                    return _MISSING
+                r.pop()
+        nxt = r.peek()
+        if nxt is None or nxt[0] <= indent:
+            return _MISSING
+        return self._rows([r.pop()], headers, delimiter)[0]
+
+    def _skip_block(self, parent: int, count: int | None) -> None:
+        """Skip the block deeper than `parent` without decoding it."""
+        r = self.reader
+        nxt = r.peek()
+        if nxt is None or nxt[0] <= parent:
+            return
+        text = nxt[1]
+        if count is not None:
+            # a list with a length marker: header (if any) + exactly `count`
+            # non-blank lines; empty-header tables have blank rows
+            if text.startswith("- "):
+                r.skip_lines(count)
+            elif text[0] == "{" and text.endswith("}:") and text != "{}:":
+                r.skip_lines(count + 1)
+            else:
+                r.skip_deeper(parent)
+                return
+            nxt = r.peek()
+            if nxt is not None and nxt[0] > parent:
+                raise self._error(f"Length marker [{count},] does not match the block",
+                                  nxt[2])
+            return
+        r.skip_deeper(parent)
+
+    def _member_lines(self, indent: int) -> Iterator[tuple[str, int | None, str | None, int]]:
+        """Yield (key, length marker, raw value, lineno) per member line; the
+        value is None when the member's value is the block that follows."""
+        r = self.reader
+        while True:
+            nxt = r.peek()
+            if nxt is None or nxt[0] < indent:
+                return
+            if nxt[0] > indent:
+                raise self._error("Unexpected indentation", nxt[2])
+            _, text, lineno = r.pop()
+            m = _KEY_LINE_RE.match(text)
+            if m is None:
+                raise self._error("Expected 'key: value'", lineno)
+            key, count, value = m.groups()
+            yield key, (int(count) if count is not None else None), value, lineno
+
+    def _item_texts(self, indent: int) -> Iterator[str]:
+        r = self.reader
+        while True:
+            nxt = r.peek()
+            if nxt is None or nxt[0] != indent or not nxt[1].startswith("- "):
+                return
+            yield r.pop()[1][2:]
+
+    def _table_batches(self, indent: int, count: int | None = None) -> Iterator[list[dict]]:
+        """Consume a table header at `indent` and yield its rows in batches."""
+        header = self.reader.pop()[1][1:-2]
+        delimiter = self.delimiter or _detect_delimiter(header)
+        headers = header.split(delimiter) if header else []
+        if not headers and count:
+            # rows of an empty-header table are blank lines
+            self.reader.skip_deeper(indent)
+            yield [{} for _ in range(count)]
+            return
+        r = self.reader
+        batch = []
+        while True:
+            nxt = r.peek()
+            if nxt is None or nxt[0] <= indent:
+                break
+            batch.append(r.pop())
+            if len(batch) >= _TABLE_CHUNK:
+                yield self._rows(batch, headers, delimiter)
+                batch = []
+        if batch:
+            yield self._rows(batch, headers, delimiter)
+
+    def _rows(self, batch: list, headers: list, delimiter: str) -> list[dict]:
+        """Decode a batch of row lines with one JSON parse for the batch.
+
+        Rows are rewritten as JSON arrays ("[c1,c2]") and parsed together;
+        if that fails each row is parsed on its own to find the bad line.
+        """
+        if delimiter == ",":
+            texts = [t for _, t, _ in batch]
+        elif delimiter == "\t":
+            # JSON text never contains a raw tab, so this cannot split a cell
+            texts = [t.replace("\t", ",") for _, t, _ in batch]
+        else:
+            cell = _cell_re(delimiter)
+            texts = [",".join(cell.findall(t)) for _, t, _ in batch]
+        try:
+            rows = _loads("[[" + "],[".join(texts) + "]]")
+        except Exception:
+            rows = []
+            for t, (_, _, lineno) in zip(texts, batch):
                 try:
-                    parent[key] = json.loads(val)
-                except Exception:
-                    parent[key] = val
-    return root
+                    rows.append(_loads(f"[{t}]"))
+                except ValueError as e:
+                    raise self._error(f"Invalid table row ({e})", lineno) from None
+        n = len(headers)
+        for cells, (_, _, lineno) in zip(rows, batch):
+            if len(cells) != n:
+                raise self._error(f"Expected {n} cells, got {len(cells)}", lineno)
+        return [dict(zip(headers, cells)) for cells in rows]
+
+
+def _coalesce(chunks: Iterable[str], size: int = 1 << 16) -> Iterator[str]:
+    """Merge small text chunks into pieces of roughly `size` characters."""
+    buf = []
+    n = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        n += len(chunk)
+        if n >= size:
+            yield "".join(buf)
+            buf = []
+            n = 0
+    if buf:
+        yield "".join(buf)
+
+
+def _text_lines(text: str) -> Iterator[str]:
+    return map(operator.itemgetter(1), _iter_text_records(text, "\n"))
+
+
+def toon_to_json(text: str, delimiter: str | None = None,
+                 root: str | None = None) -> Any:
+    """Decode TOON text produced by `to_toon` back into Python objects.
+
+    With `root` only the value at that dotted path is decoded.
+    """
+    decoder = ToonDecoder(_text_lines(text), delimiter)
+    return decoder.decode_path(root) if root else decoder.decode()
+
+
+# ------------------------------
+# Parallel NDJSON conversion
+# ------------------------------
+
+# An NDJSON file is cut into byte ranges on line boundaries and converted in
+# two passes over them, both run in worker processes: the first parses each
+# range and reports its keys (and column types), from which the parent
+# merges the table header; the second parses each range again and encodes
+# its rows against that header.  Ranges come back in file order, so the
+# output equals `to_toon` of the whole file parsed at once.
+
+_NDJSON_RANGE = 1 << 24
+
+
+def ndjson_ranges(path: str, size: int = _NDJSON_RANGE) -> list[tuple[int, int]]:
+    """Split the file at `path` into (start, stop) byte ranges of about
+    `size` bytes, each starting at the beginning of a line."""
+    end = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < end:
+            f.seek(start + size - 1)
+            f.readline()
+            stop = min(f.tell(), end)
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def _read_range(path: str, start: int, stop: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    return data.removeprefix(_BOM) if start == 0 else data
+
+
+def _range_records(data: bytes, first_line: int = 1) -> list:
+    """The records on the lines of one byte range of an NDJSON file."""
+    return list(_parse_records(enumerate(data.split(b"\n"), first_line), "ndjson"))
+
+
+def _scan_range(path: str, start: int, stop: int,
+                coerce: bool | str) -> tuple[int, list, dict | None]:
+    """First-pass task: the range's newline count, its first two records,
+    and its keys in order of appearance, each mapped to the column's
+    `_string_kinds` with `coerce="columns"` (else None); no keys at all
+    (None) if a record is not an object."""
+    data = _read_range(path, start, stop)
+    records = _range_records(data)
+    if not all(isinstance(r, dict) for r in records):
+        return data.count(b"\n"), records[:2], None
+    schema = TableSchema.discover(records)
+    kinds = schema.string_kinds(records) if coerce == "columns" else ()
+    keys = dict(itertools.zip_longest(schema.headers, kinds))
+    return data.count(b"\n"), records[:2], keys
+
+
+def _encode_range(path: str, start: int, stop: int, headers: list | None,
+                  kinds: list | None, indent: int, delimiter: str,
+                  coerce: bool | str) -> str:
+    """Second-pass task: the TOON lines of one range's records, joined;
+    table rows against `headers`, or `- item` lines when it is None."""
+    records = _range_records(_read_range(path, start, stop))
+    if headers is None:
+        fmt = _format_coerced if coerce else format_scalar
+        return "\n".join([f"- {fmt(x)}" for x in records])
+    row_pad = " " * indent
+    if not headers:
+        return "\n".join(itertools.repeat(row_pad, len(records)))
+    schema = TableSchema.fixed(headers, kinds)
+    kinds = kinds or [None] * len(headers)
+    lines = []
+    for i in range(0, len(records), _TABLE_CHUNK):
+        columns = schema.columns(records[i:i + _TABLE_CHUNK])
+        lines.extend(_row_lines(columns, kinds, row_pad, delimiter, coerce))
+    return "\n".join(lines)
+
+
+def iter_ndjson_toon(path: str, pool: TablePool, indent: int = 0,
+                     delimiter: str = ",", length_marker: bool = False,
+                     coerce: bool | str = False,
+                     range_size: int = _NDJSON_RANGE) -> Iterator[str]:
+    """Convert the NDJSON file at `path` into TOON chunks in `pool`'s workers.
+
+    Concatenating the chunks gives `to_toon(load_json(text), ...)` for the
+    file's text.  A file holding a single record is that document, and is
+    converted serially.
+    """
+    ranges = ndjson_ranges(path, range_size)
+    headers: dict | None = {}
+    first: list = []
+    line = 1
+    scans = pool.map(_scan_range, ((path, start, stop, coerce) for start, stop in ranges))
+    for start, stop in ranges:
+        try:
+            newlines, head, keys = next(scans)
+        except ValueError:
+            # parse again here for the error with its line number in the file
+            _range_records(_read_range(path, start, stop), line)
+            raise
+        line += newlines
+        first.extend(head[:2 - len(first)])
+        if keys is None:
+            headers = None
+        elif headers is not None:
+            for key, kinds in keys.items():
+                headers.setdefault(key, set()).update(kinds or ())
+    if not first:
+        raise ValueError("Empty input.")
+    if len(first) == 1:
+        yield from iter_toon(first[0], indent, delimiter=delimiter,
+                             length_marker=length_marker, coerce=coerce, pool=pool)
+        return
+    kinds = None
+    if headers is not None:
+        if coerce == "columns":
+            kinds = list(map(_column_kind, headers.values()))
+        headers = list(headers)
+        yield f"{{{delimiter.join(headers)}}}:"
+    sep = "\n" if headers is not None else ""
+    for text in pool.map(_encode_range, (
+            (path, start, stop, headers, kinds, indent, delimiter, coerce)
+            for start, stop in ranges)):
+        if text:
+            yield sep + text
+            sep = "\n"
+
+
+# ------------------------------
+# Conversion API
+# ------------------------------
+
+MODES = ("json2toon", "toon2json")
+DELIMITERS = {"comma": ",", "tab": "\t", "pipe": "|"}
+
+
+class ConversionError(ValueError):
+    """Raised when an input cannot be converted."""
+
+
+def _conversion_error(e: Exception) -> ConversionError:
+    if isinstance(e, ConversionError):
+        return e
+    if isinstance(e, KeyError) and e.args:
+        # KeyError quotes its message; unwrap it for readable errors.
+        return ConversionError(str(e.args[0]))
+    return ConversionError(str(e))
+
+
+class Converter:
+    """Reusable in-process converter configured once with the CLI options."""
+
+    def __init__(self, root: str | None = None, indent: int = 2,
+                 delimiter: str = "comma", length_marker: bool = False,
+                 coerce: bool | str = False, pretty: bool = False,
+                 ensure_ascii: bool = False, input_format: str = "auto",
+                 jobs: int = 1, chunk_rows: int = 1 << 15, memo_bytes: int = 0):
+        if delimiter not in DELIMITERS:
+            raise ConversionError(f"Invalid delimiter: {delimiter}")
+        if input_format not in INPUT_FORMATS:
+            raise ConversionError(f"Invalid input format: {input_format}")
+        if isinstance(coerce, str) and coerce not in COERCE_MODES:
+            raise ConversionError(f"Invalid coerce mode: {coerce}")
+        if jobs < 1 or chunk_rows < 1:
+            raise ConversionError("jobs and chunk_rows must be positive")
+        self.root = root
+        self.indent = indent
+        self.delimiter = DELIMITERS[delimiter]
+        self.length_marker = length_marker
+        self.coerce = coerce
+        self.pretty = pretty
+        self.ensure_ascii = ensure_ascii
+        self.input_format = input_format
+        # large tables are encoded in `jobs` worker processes
+        self.pool = TablePool(jobs, chunk_rows) if jobs > 1 else None
+        # repeated subtrees are encoded once, across conversions
+        self.memo = FragmentMemo(memo_bytes) if memo_bytes > 0 else None
+
+    def close(self) -> None:
+        """Stop the worker processes of a `jobs` > 1 converter."""
+        if self.pool is not None:
+            self.pool.close()
+
+    def json2toon(self, text: str) -> str:
+        """Convert JSON (or NDJSON) text into TOON."""
+        try:
+            data = load_json(text, self.input_format)
+            if self.root:
+                data = extract_root(data, self.root)
+            return to_toon(data, indent=self.indent, delimiter=self.delimiter,
+                           length_marker=self.length_marker, coerce=self.coerce,
+                           pool=self.pool, memo=self.memo)
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def iter_json2toon(self, text: str) -> Iterator[str]:
+        """Like `json2toon`, but return the TOON output as a chunk iterator.
+
+        Parsing happens up front, so input errors are raised by this call;
+        only encoding is deferred to iteration.
+        """
+        try:
+            data = load_json(text, self.input_format)
+            if self.root:
+                data = extract_root(data, self.root)
+        except Exception as e:
+            raise _conversion_error(e) from e
+        return self._iter_chunks(data)
+
+    def json2toon_roots(self, text: str, roots: Iterable[str]) -> dict[str, str]:
+        """Convert the subtree at each of `roots` into TOON, parsing `text`
+        once.  Returns the TOON text per root, in the order given."""
+        try:
+            selected = extract_roots(load_json(text, self.input_format), roots)
+        except Exception as e:
+            raise _conversion_error(e) from e
+        return {root: "".join(self._iter_chunks(data)) for root, data in selected.items()}
+
+    def iter_json2toon_roots_stream(self, fp: IO[bytes],
+                                    roots: Iterable[str]) -> dict[str, Iterator[str]]:
+        """Read binary `fp` once and return a TOON chunk iterator per root.
+
+        Only the selected subtrees of a JSON document are parsed (see
+        `select_roots`); input errors are raised by this call.
+        """
+        try:
+            selected = self._open_roots(fp, roots)
+        except Exception as e:
+            raise _conversion_error(e) from e
+        return {root: self._iter_chunks(data) for root, data in selected.items()}
+
+    def iter_json2toon_stream(self, fp: IO[bytes]) -> Iterator[str]:
+        """Convert JSON read incrementally from binary `fp` into TOON chunks.
+
+        A top-level array, or a sequence of NDJSON / JSON-seq records, is
+        parsed and encoded one element at a time.  With a `root` selection
+        only the selected subtree of a JSON document is parsed; any other
+        document is parsed whole.
+        """
+        try:
+            data, rows = self._open_stream(fp)
+            if rows is not None:
+                yield from iter_toon_rows(rows, indent=self.indent,
+                                          delimiter=self.delimiter, coerce=self.coerce,
+                                          pool=self.pool)
+                return
+            yield from self._iter_chunks(data)
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def iter_json2toon_file(self, fp: IO[bytes]) -> Iterator[str]:
+        """Like `iter_json2toon_stream` for seekable binary `fp`, but with the
+        output of `json2toon`.
+
+        Streamed rows are read twice: first to find the table header (and
+        column types) of the whole array with `scan_rows`, then, from the
+        start again, to encode them.  Invalid UTF-8 is replaced.
+        """
+        try:
+            start = fp.tell()
+            data, rows = self._open_stream(utf8_reader(fp))
+            if rows is None:
+                yield from self._iter_chunks(data)
+                return
+            schema = scan_rows(rows, self.coerce)
+            fp.seek(start)
+            _, rows = self._open_stream(utf8_reader(fp))
+            yield from iter_toon_rows(rows, indent=self.indent,
+                                      delimiter=self.delimiter, coerce=self.coerce,
+                                      pool=self.pool, schema=schema)
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def iter_ndjson2toon_file(self, path: str) -> Iterator[str]:
+        """Convert the NDJSON file at `path` into TOON chunks, parsing and
+        encoding ranges of its lines in the worker processes of a `jobs` > 1
+        converter (see `iter_ndjson_toon`).  The output equals `json2toon`
+        of the file's text; a `root` is not supported.
+        """
+        if self.pool is None or self.root:
+            raise ConversionError("Parallel NDJSON conversion needs jobs > 1 "
+                                  "and no root")
+        try:
+            yield from iter_ndjson_toon(path, self.pool, indent=self.indent,
+                                        delimiter=self.delimiter,
+                                        length_marker=self.length_marker,
+                                        coerce=self.coerce)
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def _sniff(self, fp: IO[bytes]) -> tuple[IO[bytes], str]:
+        if self.input_format == "auto":
+            return sniff_stream(fp)
+        return fp, self.input_format
+
+    def _end(self, stream: JsonStream) -> Iterator[Any] | None:
+        """After the first value of a JSON input: None at its end, or the
+        records that follow it if the format was only sniffed (see
+        `JsonStream.next_records`)."""
+        if self.input_format == "auto":
+            return stream.next_records()
+        stream.expect_end()
+        return None
+
+    def _select(self, stream: JsonStream, roots: list[str]) -> dict[str, Any]:
+        """`read_roots` on a JSON input that may turn out to be a record
+        sequence (see `_end`).  Paths that may lead into the records need
+        the first value whole; others are selected lazily."""
+        array = stream.peek() == "["
+        if (not array and self.input_format == "auto"
+                and any(_record_path(root) for root in roots)):
+            first = stream.read_value()
+            records = self._end(stream)
+            return extract_roots(first if records is None else [first, *records], roots)
+        selected = select_roots(stream, roots)
+        if self._end(stream) is not None:
+            if array:
+                raise ValueError(_ARRAY_RECORD)
+            # paths starting with a key find nothing among records
+            return extract_roots([], roots)
+        return selected
+
+    def _open_roots(self, fp: IO[bytes], roots: Iterable[str]) -> dict[str, Any]:
+        """The value at each of `roots` in a binary input, read in one pass."""
+        fp, fmt = self._sniff(fp)
+        if fmt == "json":
+            stream = JsonStream(fp)
+            if not stream.peek():
+                raise ValueError("Empty input.")
+            return self._select(stream, list(roots))
+        records = list(iter_ndjson(fp) if fmt == "ndjson" else iter_json_seq(fp))
+        if not records:
+            raise ValueError("Empty input.")
+        # a single record is the document itself, as in load_json
+        return extract_roots(records if len(records) > 1 else records[0], roots)
+
+    def _open_stream(self, fp: IO[bytes]) -> tuple[Any, Iterator[Any] | None]:
+        """Return (document, None) or (None, lazy rows) for a binary input.
+
+        With a `root` selection the document is the selected value.
+        """
+        fp, fmt = self._sniff(fp)
+        if fmt == "json":
+            stream = JsonStream(fp)
+            if not stream.peek():
+                raise ValueError("Empty input.")
+            if self.root:
+                return self._select(stream, [self.root])[self.root], None
+            if stream.peek() == "[":
+                def rows():
+                    yield from stream.iter_values()
+                    if self._end(stream) is not None:
+                        raise ValueError(_ARRAY_RECORD)
+                return None, rows()
+            data = stream.read_value()
+            records = self._end(stream)
+            if records is None:
+                return data, None
+            records = itertools.chain([data], records)
+        else:
+            records = iter_ndjson(fp) if fmt == "ndjson" else iter_json_seq(fp)
+        first = next(records, _MISSING)
+        if first is _MISSING:
+            raise ValueError("Empty input.")
+        second = next(records, _MISSING)
+        if second is _MISSING:
+            # a single record is the document itself, as in load_json
+            data = first
+        elif not self.root:
+            return None, itertools.chain([first, second], records)
+        else:
+            data = [first, second, *records]
+        return (extract_root(data, self.root) if self.root else data), None
+
+    def _iter_chunks(self, data: Any) -> Iterator[str]:
+        try:
+            yield from iter_toon(data, indent=self.indent, delimiter=self.delimiter,
+                                 length_marker=self.length_marker, coerce=self.coerce,
+                                 pool=self.pool, memo=self.memo)
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def toon2json(self, text: str) -> str:
+        """Convert TOON text (or its `root` sub-path) into JSON."""
+        try:
+            data = toon_to_json(text, root=self.root)
+            return json.dumps(
+                data,
+                indent=(self.indent if self.pretty else None),
+                ensure_ascii=self.ensure_ascii,
+            )
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def iter_toon2json_stream(self, fp: IO[str]) -> Iterator[str]:
+        """Convert TOON read line by line from text file `fp` into JSON chunks.
+
+        JSON is written as each structure is decoded, so large tables are
+        converted in constant memory.  With a `root` selection only that
+        value is decoded and reading stops once it is found.
+        """
+        decoder = ToonDecoder(fp)
+        indent = self.indent if self.pretty else None
+        try:
+            if self.root:
+                yield json.dumps(decoder.decode_path(self.root), indent=indent,
+                                 ensure_ascii=self.ensure_ascii)
+            else:
+                yield from _coalesce(decoder.iter_json(indent=indent,
+                                                       ensure_ascii=self.ensure_ascii))
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def convert(self, text: str, mode: str = "json2toon") -> str:
+        """Dispatch to the converter for `mode`."""
+        if mode not in MODES:
+            raise ConversionError("Invalid mode")
+        return getattr(self, mode)(text)
+
+    def convert_file(self, fp: IO[bytes], mode: str = "json2toon") -> str:
+        """Like `convert` for UTF-8 read from seekable binary `fp`.
+
+        Invalid UTF-8 is replaced as by `bytes.decode(errors="replace")`.
+        Inputs of up to `_WHOLE_INPUT` bytes are converted as text, which is
+        fastest; larger ones are read incrementally (see
+        `iter_json2toon_file` and `iter_toon2json_stream`), so a top-level
+        array or a record sequence is never held in memory whole.  The
+        output is that of `convert` either way.
+        """
+        if mode not in MODES:
+            raise ConversionError("Invalid mode")
+        text = _small_text(fp)
+        if text is not None:
+            return self.convert(text, mode)
+        if mode == "json2toon":
+            return "".join(self.iter_json2toon_file(fp))
+        text = io.TextIOWrapper(fp, "utf-8", errors="replace")
+        try:
+            return "".join(self.iter_toon2json_stream(text))
+        finally:
+            text.detach()  # leave `fp` open for the caller
+
+    def json2toon_roots_file(self, fp: IO[bytes], roots: Iterable[str]) -> dict[str, str]:
+        """Like `json2toon_roots` for UTF-8 read from seekable binary `fp`,
+        incrementally unless it is small (see `convert_file`)."""
+        text = _small_text(fp)
+        if text is not None:
+            return self.json2toon_roots(text, roots)
+        selected = self.iter_json2toon_roots_stream(utf8_reader(fp), roots)
+        return {root: "".join(chunks) for root, chunks in selected.items()}
+
+    def session(self) -> "EditSession":
+        """Start an `EditSession` with this converter's options."""
+        return EditSession(self)
+
+
+class EditSession:
+    """json2toon for successive versions of one edited document.
+
+    The last document and its encoded fragments are kept, so a new version
+    (`update`) or a JSON Patch against the last one (`patch`) only
+    re-encodes what changed; see `IncrementalEncoder`.
+    """
+
+    def __init__(self, converter: Converter):
+        self.converter = converter
+        self.document: Any = _MISSING
+        self.version = 0
+        self._encoder = IncrementalEncoder(
+            indent=converter.indent, delimiter=converter.delimiter,
+            length_marker=converter.length_marker, coerce=converter.coerce)
+
+    @property
+    def stats(self) -> dict:
+        """Fragments reused and encoded by the last conversion."""
+        return {"reused": self._encoder.reused, "encoded": self._encoder.encoded}
+
+    def update(self, text: str) -> str:
+        """Convert `text`, the new version of the document, into TOON."""
+        try:
+            return self._encode(load_json(text, self.converter.input_format), False)
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def patch(self, patch: list[dict]) -> str:
+        """Apply an RFC 6902 JSON Patch to the last version and convert it."""
+        if self.document is _MISSING:
+            raise ConversionError("No document to patch")
+        try:
+            return self._encode(apply_json_patch(self.document, patch), True)
+        except Exception as e:
+            raise _conversion_error(e) from e
+
+    def _encode(self, document: Any, patched: bool) -> str:
+        root = self.converter.root
+        text = self._encoder.encode(extract_root(document, root) if root else document,
+                                    patched)
+        self.document = document
+        self.version += 1
+        return text
 
 
 # ------------------------------
 # CLI entry
 # ------------------------------
 
+def _write_outputs(outputs: dict[str, Iterable[str]]) -> None:
+    """Write each chunk iterator to its file, all files concurrently."""
+    def write(path: str, chunks: Iterable[str]) -> None:
+        with open(path, "w", encoding="utf-8") as out:
+            out.writelines(chunks)
+
+    with ThreadPoolExecutor(max_workers=len(outputs) or 1) as pool:
+        futures = [pool.submit(write, path, chunks) for path, chunks in outputs.items()]
+        for future in futures:
+            future.result()
+
+
+def _report_memo(memo: FragmentMemo | None) -> None:
+    """Print how much output `--memoize` reused to stderr."""
+    if memo is not None:
+        stats = memo.stats()
+        print(f"memo: {stats['saved']} bytes reused ({stats['hits']} hits, "
+              f"{stats['misses']} misses)", file=sys.stderr)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Convert between JSON and TOON formats."
     )
     parser.add_argument("input", help="Input file (or - for stdin)")
     parser.add_argument("-o", "--output", help="Output file")
-    parser.add_argument("--mode", choices=["json2toon", "toon2json"], default="json2toon")
+    parser.add_argument("--mode", choices=MODES, default="json2toon")
     parser.add_argument("--root", help="Dotted path to nested key for conversion")
+    parser.add_argument("--extract", action="append", metavar="PATH=FILE",
+                        help="Convert the subtree at PATH into FILE; repeat to "
+                             "write several subtrees from one read of the input")
     parser.add_argument("--indent", type=int, default=2)
-    parser.add_argument("--delimiter", choices=["comma", "tab", "pipe"], default="comma")
+    parser.add_argument("--delimiter", choices=list(DELIMITERS), default="comma")
     parser.add_argument("--length-marker", action="store_true")
     parser.add_argument("--coerce", action="store_true")
+    parser.add_argument("--coerce-columns", action="store_true",
+                        help="Like --coerce, but give each table column one type")
     parser.add_argument("--pretty", action="store_true")
     parser.add_argument("--ensure-ascii", action="store_true")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the input incrementally instead of all at once")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS, default="auto",
+                        help="JSON input format (default: sniff the first bytes)")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="Encode large tables in N worker processes; an "
+                             "NDJSON input file is also parsed in them")
+    parser.add_argument("--chunk-rows", type=int, default=1 << 15, metavar="N",
+                        help="Rows per worker task with --jobs (default: %(default)s)")
+    parser.add_argument("--memoize", action="store_true",
+                        help="Encode repeated sub-objects once and report the "
+                             "bytes saved on stderr")
 
     args = parser.parse_args()
 
-    # Read input
-    if args.input == "-":
-        text = sys.stdin.read()
-    else:
-        text = Path(args.input).read_text(encoding="utf-8")
-
-    # Conversion
-    if args.mode == "json2toon":
-        data = load_json(text)
-        if args.root:
-            data = extract_root(data, args.root)
-        if args.coerce:
-            data = coerce_data(data)
-        delimiter = {"comma": ",", "tab": "\t", "pipe": "|"}[args.delimiter]
-        output = to_toon(data, indent=args.indent, delimiter=delimiter,
-                         length_marker=args.length_marker)
-    else:  # toon2json
-        data = toon_to_json(text)
-        output = json.dumps(
-            data,
-            indent=(args.indent if args.pretty else None),
-            ensure_ascii=args.ensure_ascii,
-        )
-
-    # Write or print
-    if args.output:
-        Path(args.output).write_text(output, encoding="utf-8")
-    else:
-        print(output)
+    targets = {}
+    for spec in args.extract or ():
+        path, _, target = spec.partition("=")
+        if not path or not target:
+            parser.error(f"--extract expects PATH=FILE, got {spec!r}")
+        if path in targets:
+            parser.error(f"--extract: {path} is given twice")
+        targets[path] = target
+    if targets and (args.mode != "json2toon" or args.root or args.output):
+        parser.error("--extract needs --mode json2toon and replaces --root and -o")
+    if args.jobs < 1 or args.chunk_rows < 1:
+        parser.error("--jobs and --chunk-rows must be positive")
+
+    converter = Converter(
+        root=args.root,
+        indent=args.indent,
+        delimiter=args.delimiter,
+        length_marker=args.length_marker,
+        coerce="columns" if args.coerce_columns else args.coerce,
+        pretty=args.pretty,
+        ensure_ascii=args.ensure_ascii,
+        input_format=args.input_format,
+        jobs=args.jobs,
+        chunk_rows=args.chunk_rows,
+        memo_bytes=(16 << 20) if args.memoize else 0,
+    )
+    try:
+        if targets:
+            fp = (sys.stdin.buffer if args.input == "-"
+                  else open(args.input, "rb", buffering=_SNIFF_BYTES))
+            outputs = converter.iter_json2toon_roots_stream(fp, targets)
+            _write_outputs({targets[root]: chunks for root, chunks in outputs.items()})
+            _report_memo(converter.memo)
+            return
+        fmt = None
+        if args.jobs > 1 and args.mode == "json2toon" and args.input != "-" and not args.root:
+            with open(args.input, "rb", buffering=_SNIFF_BYTES) as fp:
+                fmt = converter._sniff(fp)[1]
+        # A root selection reads the input incrementally as well, so that
+        # only the selected subtree is parsed.
+        if fmt == "ndjson":
+            chunks = converter.iter_ndjson2toon_file(args.input)
+        elif (args.stream or args.root) and args.mode == "json2toon":
+            fp = (sys.stdin.buffer if args.input == "-"
+                  else open(args.input, "rb", buffering=_SNIFF_BYTES))
+            chunks = converter.iter_json2toon_stream(fp)
+        elif args.stream:
+            fp = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            chunks = converter.iter_toon2json_stream(fp)
+        else:
+            # Read input
+            if args.input == "-":
+                text = sys.stdin.read()
+            else:
+                text = Path(args.input).read_text(encoding="utf-8")
+
+            if args.mode == "json2toon":
+                chunks = converter.iter_json2toon(text)
+            else:
+                chunks = iter([converter.toon2json(text)])
+
+        # Write or print
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                out.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
+            sys.stdout.write("\n")
+        _report_memo(converter.memo)
+    except ConversionError as e:
+        sys.exit(f"error: {e}")
+    finally:
+        converter.close()
 
 
 if __name__ == "__main__":
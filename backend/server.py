@@ -1,12 +1,121 @@
-from fastapi import FastAPI, UploadFile, Form
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import subprocess
-import tempfile
+import asyncio
+import io
+import itertools
+import json
 import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from fastapi import FastAPI, HTTPException, UploadFile, Form, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from cache import ResultCache
+from executors import ConversionExecutor, ExecutorBusy, ExecutorFailed, ExecutorTimeout
+from json_to_toon import MODES, Converter, ConversionError, EditSession
+
+executor = ConversionExecutor.from_env()
+cache = ResultCache.from_env()
+MAX_SESSIONS = int(os.environ.get("TOON_MAX_SESSIONS", 128))
+MAX_SESSION_BYTES = int(os.environ.get("TOON_SESSION_BYTES", 256 << 20))
+SESSION_TTL = float(os.environ.get("TOON_SESSION_TTL", "3600") or "inf")
+MAX_BODY_BYTES = int(os.environ.get("TOON_MAX_BODY_BYTES", 100 << 20))
+# uploads are checked for being blank this many bytes at a time
+EMPTY_PEEK = 1 << 16
+MEDIA_TYPES = {"json2toon": "text/plain; charset=utf-8",
+               "toon2json": "application/json"}
+
+
+@dataclass
+class SessionEntry:
+    """An editing session with its lock and what it costs to keep."""
+    session: EditSession
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    input_size: int = 0  # JSON sent for the current document, as characters
+    output_size: int = 0
+    used: float = field(default_factory=time.monotonic)
+
+    @property
+    def size(self) -> int:
+        return self.input_size + self.output_size
+
+
+# editing sessions, least recently used first
+sessions: OrderedDict[str, SessionEntry] = OrderedDict()
+
+
+def prune_sessions() -> None:
+    """Drop sessions idle for longer than `SESSION_TTL`, then the least
+    recently used ones while there are more than `MAX_SESSIONS` or they add
+    up to more than `MAX_SESSION_BYTES`.  The most recently used session is
+    always kept."""
+    idle = time.monotonic() - SESSION_TTL
+    while sessions and next(iter(sessions.values())).used < idle:
+        sessions.popitem(last=False)
+    total = sum(entry.size for entry in sessions.values())
+    while len(sessions) > 1 and (len(sessions) > MAX_SESSIONS
+                                 or total > MAX_SESSION_BYTES):
+        total -= sessions.popitem(last=False)[1].size
+
+
+class BodyTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(413, f"Request body exceeds {max_bytes} bytes.")
+
+    def response(self) -> JSONResponse:
+        return JSONResponse({"ok": False, "error": self.detail}, status_code=413)
+
+
+class BodyLimit:
+    """ASGI middleware rejecting request bodies larger than `max_bytes`.
+
+    A too large Content-Length is answered before the body is read;
+    otherwise reading stops with `BodyTooLarge` once the received chunks
+    add up to more.  `max_bytes=0` disables the limit.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = BodyTooLarge(self.max_bytes).response()
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise BodyTooLarge(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor.start()
+    yield
+    executor.shutdown()
+
 
-app = FastAPI(title="JSON ⇄ TOON Converter API")
+app = FastAPI(title="JSON ⇄ TOON Converter API", lifespan=lifespan)
 
+app.add_middleware(BodyLimit, max_bytes=MAX_BODY_BYTES)
+app.add_exception_handler(BodyTooLarge, lambda request, exc: exc.response())
 # Enable CORS for frontend (React)
 app.add_middleware(
     CORSMiddleware,
@@ -16,23 +125,58 @@ app.add_middleware(
 )
 
 
-def run_converter(stdin_text: str, args: list[str]) -> str:
-    """Run the json_to_toon CLI as a subprocess."""
-    process = subprocess.run(
-        ["python", "json_to_toon.py", "-", *args],
-        input=stdin_text.encode("utf-8"),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    if process.returncode != 0:
-        raise RuntimeError(process.stderr.decode("utf-8")[:4000])
-    return process.stdout.decode("utf-8")
+def output_filename(file: UploadFile | None, mode: str, root: str | None = None) -> str:
+    """Name of the converted file offered for download (per root, if given)."""
+    suffix = f".{root}" if root else ""
+    if mode == "json2toon":
+        return (file.filename if file else "input.json").rsplit(".", 1)[0] + suffix + ".toon"
+    return (file.filename if file else "input.toon").rsplit(".", 1)[0] + suffix + ".json"
+
+
+def coerce_mode(coerce: str | None) -> bool | str:
+    """`coerce` form field: "columns" selects per-column typing, any other
+    non-empty value per-value coercion."""
+    return "columns" if coerce == "columns" else bool(coerce)
+
+
+def cache_options(mode: str, converter: Converter, roots: list[str]) -> dict:
+    """The options that affect the output of a conversion, for its cache key."""
+    if mode == "json2toon":
+        return {"mode": mode, "root": converter.root, "roots": roots,
+                "indent": converter.indent, "delimiter": converter.delimiter,
+                "length_marker": converter.length_marker, "coerce": converter.coerce}
+    return {"mode": mode, "root": converter.root,
+            "indent": converter.indent if converter.pretty else None,
+            "ensure_ascii": converter.ensure_ascii}
+
+
+async def read_input(file: UploadFile | None, text: str | None) -> str:
+    """Return the uploaded file or the `text` field as a string."""
+    return (await file.read()).decode("utf-8", "replace") if file else (text or "")
+
+
+async def is_empty(file: UploadFile | None, text: str | None) -> bool:
+    """True if the upload (or else `text`) holds nothing but whitespace.
+
+    An upload is read `EMPTY_PEEK` bytes at a time until something else
+    turns up, then rewound for the conversion.
+    """
+    if file is None:
+        return not (text or "").strip()
+    while True:
+        chunk = await file.read(EMPTY_PEEK)
+        # decoded, so that the same characters count as blank as for `text`
+        if chunk.decode("utf-8", "replace").strip() or not chunk:
+            break
+    await file.seek(0)
+    return not chunk
 
 
 @app.post("/api/convert")
 async def convert(
     mode: str = Form(...),
     root: str | None = Form(None),
+    roots: list[str] | None = Form(None),
     delimiter: str = Form("comma"),
     indent: int = Form(2),
     length_marker: str | None = Form(None),
@@ -42,39 +186,274 @@ async def convert(
     file: UploadFile | None = None,
     text: str | None = Form(None),
 ):
-    """Main conversion endpoint."""
-    raw = (await file.read()).decode("utf-8", "replace") if file else (text or "")
-    if not raw.strip():
+    """Main conversion endpoint.
+
+    With several `roots` (json2toon only) the input is parsed once and one
+    output is returned per root.  Results are cached by input and options.
+    An uploaded file is converted while it is read, never decoded whole.
+    """
+    if await is_empty(file, text):
         return JSONResponse({"ok": False, "error": "Empty input."}, status_code=400)
 
-    try:
-        if mode == "json2toon":
-            args = ["--indent", str(indent), "--delimiter", delimiter]
-            if root:
-                args += ["--root", root]
-            if length_marker:
-                args += ["--length-marker"]
-            if coerce:
-                args += ["--coerce"]
-            output = run_converter(raw, args)
-            filename = (file.filename if file else "input.json").rsplit(".", 1)[0] + ".toon"
-
-        elif mode == "toon2json":
-            args = ["--mode", "toon2json"]
-            if pretty:
-                args += ["--pretty"]
-            if ensure_ascii:
-                args += ["--ensure-ascii"]
-            output = run_converter(raw, args)
-            filename = (file.filename if file else "input.toon").rsplit(".", 1)[0] + ".json"
-
-        else:
-            return JSONResponse({"ok": False, "error": "Invalid mode"}, status_code=400)
-
-        return {"ok": True, "filename": filename, "content": output}
+    if mode not in MODES:
+        return JSONResponse({"ok": False, "error": "Invalid mode"}, status_code=400)
 
+    roots = [r for r in roots or () if r]
+    if roots and mode != "json2toon":
+        return JSONResponse({"ok": False, "error": "roots require json2toon"},
+                            status_code=400)
+
+    try:
+        converter = Converter(
+            root=root or None,
+            indent=indent,
+            delimiter=delimiter,
+            length_marker=bool(length_marker),
+            coerce=coerce_mode(coerce),
+            pretty=bool(pretty),
+            ensure_ascii=bool(ensure_ascii),
+        )
+        options = cache_options(mode, converter, roots)
+        key = None
+        if cache.enabled:
+            key = (await run_in_threadpool(cache.file_key, file.file, options) if file
+                   else cache.key(text, options))
+        result = await cache.get(key) if key else None
+        if result is None:
+            if file:
+                result = await executor.run_file(converter, file.file, file.size or 0,
+                                                 mode, roots)
+            elif roots:
+                result = await executor.run_roots(converter, text, roots)
+            else:
+                result = await executor.run(converter, text, mode)
+            if key:
+                await cache.put(key, result)
+    except ConversionError as e:
+        return {"ok": False, "error": str(e)}
+    except ExecutorBusy as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=503)
+    except ExecutorTimeout as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=504)
+    except ExecutorFailed as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=503)
     except Exception as e:
+        # anything else (an OSError spooling the upload, a pool error...)
+        # still gets the usual error body rather than a bare 500
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+
+    if roots:
+        return {"ok": True, "outputs": [
+            {"root": r, "filename": output_filename(file, mode, r), "content": content}
+            for r, content in result.items()
+        ]}
+    return {"ok": True, "filename": output_filename(file, mode), "content": result}
+
+
+def session_response(sid: str, session: EditSession, content: str) -> JSONResponse:
+    etag = f'"{sid}-{session.version}"'
+    return JSONResponse(
+        {"ok": True, "session": sid, "version": session.version,
+         "content": content, "stats": session.stats},
+        headers={"ETag": etag},
+    )
+
+
+async def session_call(sid: str | None, entry: SessionEntry, request: Request | None,
+                       fn, arg, size: int, patch: bool = False):
+    """Run `fn(session, arg)` through the executor, one call per session at
+    a time, honouring an If-Match header.  `size` is the length of the JSON
+    input `arg` came from, which replaces the document (or, for a `patch`,
+    adds to it)."""
+    session = entry.session
+    async with entry.lock:
+        match = request.headers.get("if-match") if request else None
+        if match and match not in ("*", f'"{sid}-{session.version}"'):
+            return JSONResponse({"ok": False, "error": "Document has changed"},
+                                status_code=412)
+        try:
+            content = await executor.run_local(fn, session, arg)
+        except ConversionError as e:
+            return {"ok": False, "error": str(e)}
+        except ExecutorBusy as e:
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=503)
+        except ExecutorTimeout as e:
+            # the call goes on and may still change the session: drop it
+            sessions.pop(sid, None)
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=504)
+    entry.input_size = entry.input_size + size if patch else size
+    entry.output_size = len(content)
+    entry.used = time.monotonic()
+    if sid is None:
+        sid = uuid.uuid4().hex
+        sessions[sid] = entry
+    prune_sessions()
+    return session_response(sid, session, content)
+
+
+def find_session(sid: str) -> SessionEntry | None:
+    """The live session `sid`, marked as the most recently used."""
+    prune_sessions()
+    entry = sessions.get(sid)
+    if entry is not None:
+        sessions.move_to_end(sid)
+        entry.used = time.monotonic()
+    return entry
+
+
+UNKNOWN_SESSION = {"ok": False, "error": "Unknown session"}
+
+
+@app.post("/api/sessions")
+async def create_session(
+    root: str | None = Form(None),
+    delimiter: str = Form("comma"),
+    indent: int = Form(2),
+    length_marker: str | None = Form(None),
+    coerce: str | None = Form(None),
+    file: UploadFile | None = None,
+    text: str | None = Form(None),
+):
+    """Start an editing session with a first JSON -> TOON conversion.
+
+    Later versions of the document (PUT) or JSON Patches against the last
+    one (PATCH) only re-encode what changed.  Responses carry an ETag that
+    may be sent back as If-Match.  Sessions idle for `TOON_SESSION_TTL`
+    seconds are dropped, as are the least recently used ones beyond
+    `TOON_MAX_SESSIONS` or `TOON_SESSION_BYTES`.
+    """
+    raw = await read_input(file, text)
+    if not raw.strip():
+        return JSONResponse({"ok": False, "error": "Empty input."}, status_code=400)
+    try:
+        session = Converter(
+            root=root or None,
+            indent=indent,
+            delimiter=delimiter,
+            length_marker=bool(length_marker),
+            coerce=coerce_mode(coerce),
+        ).session()
+    except ConversionError as e:
         return {"ok": False, "error": str(e)}
+    return await session_call(None, SessionEntry(session), None,
+                              EditSession.update, raw, len(raw))
+
+
+@app.put("/api/sessions/{sid}")
+async def update_session(
+    sid: str,
+    request: Request,
+    file: UploadFile | None = None,
+    text: str | None = Form(None),
+):
+    """Convert a new version of the session's document."""
+    raw = await read_input(file, text)
+    if not raw.strip():
+        return JSONResponse({"ok": False, "error": "Empty input."}, status_code=400)
+    entry = find_session(sid)
+    if entry is None:
+        return JSONResponse(UNKNOWN_SESSION, status_code=404)
+    return await session_call(sid, entry, request, EditSession.update, raw, len(raw))
+
+
+@app.patch("/api/sessions/{sid}")
+async def patch_session(sid: str, request: Request):
+    """Apply a JSON Patch (RFC 6902 body) to the session's document."""
+    body = await request.body()
+    try:
+        patch = json.loads(body)
+    except ValueError:
+        patch = None
+    if not isinstance(patch, list):
+        return JSONResponse({"ok": False, "error": "Body must be a JSON Patch array"},
+                            status_code=400)
+    entry = find_session(sid)
+    if entry is None:
+        return JSONResponse(UNKNOWN_SESSION, status_code=404)
+    return await session_call(sid, entry, request, EditSession.patch, patch, len(body),
+                              patch=True)
+
+
+@app.delete("/api/sessions/{sid}")
+def delete_session(sid: str):
+    """Forget an editing session."""
+    if sessions.pop(sid, None) is None:
+        return JSONResponse(UNKNOWN_SESSION, status_code=404)
+    return {"ok": True}
+
+
+@app.get("/api/cache")
+def cache_stats():
+    """Hit/miss counters and size of the conversion result cache."""
+    return cache.stats()
+
+
+def output_chunks(converter: Converter, mode: str, file: UploadFile | None,
+                  text: str | None) -> Iterator[str]:
+    """Converted output of the upload (read lazily) or of `text` as chunks.
+
+    The first chunk is produced here, so errors up to it are raised by this
+    call rather than after the response has started.
+    """
+    if mode == "json2toon":
+        chunks = (converter.iter_json2toon_file(file.file) if file
+                  else converter.iter_json2toon(text))
+    else:
+        source = (io.TextIOWrapper(file.file, "utf-8", errors="replace") if file
+                  else io.StringIO(text))
+        chunks = converter.iter_toon2json_stream(source)
+    return itertools.chain([next(chunks, "")], chunks)
+
+
+@app.post("/api/convert/stream")
+async def convert_stream(
+    mode: str = Form("json2toon"),
+    root: str | None = Form(None),
+    delimiter: str = Form("comma"),
+    indent: int = Form(2),
+    length_marker: str | None = Form(None),
+    coerce: str | None = Form(None),
+    pretty: str | None = Form(None),
+    ensure_ascii: str | None = Form(None),
+    file: UploadFile | None = None,
+    text: str | None = Form(None),
+):
+    """Conversion endpoint that streams the raw output with chunked transfer.
+
+    TOON is sent as text/plain and JSON as application/json, without the
+    JSON envelope of /api/convert, so the first bytes go out as soon as they
+    are encoded.  An uploaded top-level array, NDJSON or TOON file is read
+    and converted a few rows at a time, so memory does not grow with its
+    size; arrays are read twice, the first time for their table header (see
+    `Converter.iter_json2toon_file`), so the output is that of
+    /api/convert.  Errors after the first chunk end the stream early.
+    """
+    if await is_empty(file, text):
+        return JSONResponse({"ok": False, "error": "Empty input."}, status_code=400)
+
+    if mode not in MODES:
+        return JSONResponse({"ok": False, "error": "Invalid mode"}, status_code=400)
+
+    try:
+        converter = Converter(
+            root=root or None,
+            indent=indent,
+            delimiter=delimiter,
+            length_marker=bool(length_marker),
+            coerce=coerce_mode(coerce),
+            pretty=bool(pretty),
+            ensure_ascii=bool(ensure_ascii),
+        )
+        chunks = await run_in_threadpool(output_chunks, converter, mode, file, text)
+    except ConversionError as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+
+    filename = output_filename(file, mode)
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[mode],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @app.get("/")
@@ -0,0 +1,86 @@
+import asyncio
+import io
+import os
+import time
+
+from cache import ResultCache
+
+
+def test_memory_entries_expire():
+    cache = ResultCache(ttl=0.05)
+
+    async def scenario():
+        await cache.put("k", "value")
+        assert await cache.get("k") == "value"
+        await asyncio.sleep(0.1)
+        assert await cache.get("k") is None
+
+    asyncio.run(scenario())
+    assert cache.stats()["entries"] == 0 and cache.bytes == 0
+
+
+def test_memory_is_bounded_by_bytes():
+    cache = ResultCache(max_bytes=1000, ttl=None)
+
+    async def scenario():
+        for i in range(20):
+            await cache.put(str(i), "x" * 100)
+        assert await cache.get("19") is not None
+        assert await cache.get("0") is None
+
+    asyncio.run(scenario())
+    assert cache.bytes <= 1000 and cache.evictions
+
+
+def test_disk_hit_keeps_the_stored_expiry(tmp_path):
+    writer = ResultCache(ttl=0.2, directory=str(tmp_path))
+    reader = ResultCache(ttl=3600, directory=str(tmp_path))
+
+    async def scenario():
+        await writer.put("k", {"a": "1"})
+        await asyncio.sleep(0.1)
+        assert await reader.get("k") == {"a": "1"}
+        assert reader.disk_hits == 1
+        await asyncio.sleep(0.15)
+        # served from memory, but only until the entry's own expiry
+        assert await reader.get("k") is None
+
+    asyncio.run(scenario())
+    assert not (tmp_path / "k.json").exists()
+
+
+def test_sweep_removes_expired_then_oldest_files(tmp_path):
+    cache = ResultCache(max_bytes=0, ttl=60, directory=str(tmp_path), max_disk_bytes=10_000)
+    now = time.time()
+    for i in range(8):
+        path = tmp_path / f"{i}.json"
+        path.write_bytes(b"x" * 2000)
+        os.utime(path, (now - 100 + i, now - 100 + i) if i < 2 else (now - 10 + i,) * 2)
+    (tmp_path / "old.tmp").write_bytes(b"x")
+    os.utime(tmp_path / "old.tmp", (now - 3600, now - 3600))
+    cache._sweep()
+    # 0 and 1 expired; of the rest, the oldest go until 10k bytes remain
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{i}.json" for i in range(3, 8)]
+    assert cache.disk_bytes == 10_000 <= cache.max_disk_bytes
+    assert cache.disk_evictions == 1
+
+
+def test_writes_past_the_limit_sweep(tmp_path):
+    cache = ResultCache(max_bytes=0, ttl=None, directory=str(tmp_path), max_disk_bytes=3000)
+
+    async def scenario():
+        for i in range(10):
+            await cache.put(str(i), "x" * 1000)
+
+    asyncio.run(scenario())
+    held = sum(p.stat().st_size for p in tmp_path.iterdir())
+    assert held <= 3000 + 1100  # at most one write past the last sweep
+    assert cache.disk_evictions
+
+
+def test_file_key_matches_key_and_rewinds():
+    options = {"mode": "json2toon", "indent": 2}
+    fp = io.BytesIO("{\"a\": \"ü\"}".encode())
+    assert ResultCache.file_key(fp, options) == ResultCache.key("{\"a\": \"ü\"}", options)
+    assert fp.tell() == 0
+    assert ResultCache.key("x", options) != ResultCache.key("x", {**options, "indent": 4})
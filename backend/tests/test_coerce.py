@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from json_to_toon import (_TABLE_CHUNK, coerce_data, coerce_value, iter_toon_rows, scan_rows,
+                          to_toon)
+
+
+def reference_coerce(val):
+    """The original per-value coercion `coerce_value` must match."""
+    if isinstance(val, str):
+        low = val.lower()
+        if low == "true":
+            return True
+        if low == "false":
+            return False
+        if low == "null":
+            return None
+        try:
+            if "." in val:
+                return float(val)
+            return int(val)
+        except ValueError:
+            return val
+    return val
+
+
+ALPHABET = list("0123456789+-._eE xtrueTRUEfalsnulNULainf\t٣　²İ")
+
+
+def test_coerce_value_matches_reference():
+    rng = random.Random(17)
+    for _ in range(50000):
+        s = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 8)))
+        got, expected = coerce_value(s), reference_coerce(s)
+        assert type(got) is type(expected), s
+        assert got == expected or got != got, s  # NaN never compares equal
+
+
+@pytest.mark.parametrize("value", ["tRuE", "NULL", "1_000", "-1.5e3", " 12 ", "1e5", "0x10",
+                                   "٣٤", "9" * 5000, "inf", "nan.", ".", 3, None])
+def test_coerce_value_cases(value):
+    assert coerce_value(value) == reference_coerce(value)
+    assert type(coerce_value(value)) is type(reference_coerce(value))
+
+
+def test_coerce_while_encoding_matches_coerced_copy():
+    doc = {"a": ["1", "2.5", "true", {"b": "null", "c": ["007", "x"]}],
+           "rows": [{"id": "1", "v": "2.0"}, {"id": "x", "v": "NULL"}], "s": "False"}
+    assert to_toon(doc, indent=2, coerce=True) == to_toon(coerce_data(doc), indent=2)
+
+
+COLUMN_VALUES = {
+    "ints": ["1", "-2", "007", " 3 ", "1_000"],
+    "floats": ["1.5", "-0.25", "2.", ".5"],
+    "bools": ["true", "False", "TRUE"],
+    "words": ["A17", "x", "1e5", "--1"],
+    "gaps": ["null", "NULL", ""],
+}
+
+
+def reference_columns(rows):
+    """`coerce="columns"`: each column of strings gets the one type its
+    strings coerce to (ints with floats make floats), else stays text;
+    "null" is None and "" stays "" in every column."""
+    out = [dict(row) for row in rows]
+    for key in rows[0]:
+        strings = {row[key] for row in rows} - {""}
+        kinds = {type(reference_coerce(s)) for s in strings} - {type(None)}
+        kind = float if kinds == {int, float} else kinds.pop() if len(kinds) == 1 else str
+        for row in out:
+            v = row[key]
+            if v == "":
+                continue
+            if reference_coerce(v) is None:
+                row[key] = None
+            elif kind in (int, float):
+                row[key] = kind(v)
+            elif kind is bool:
+                row[key] = reference_coerce(v)
+    return out
+
+
+def random_rows(rng, n):
+    columns = {}
+    for i in range(rng.randint(1, 5)):
+        pools = rng.sample(sorted(COLUMN_VALUES), rng.randint(1, 3))
+        columns[f"c{i}"] = [v for pool in pools for v in COLUMN_VALUES[pool]]
+    return [{k: rng.choice(pool) for k, pool in columns.items()} for _ in range(n)]
+
+
+def test_columns_get_one_type():
+    rng = random.Random(18)
+    for _ in range(300):
+        rows = random_rows(rng, rng.randint(1, 8))
+        assert to_toon(rows, indent=2, coerce="columns") == to_toon(reference_columns(rows),
+                                                                  indent=2)
+
+
+def test_column_kinds_of_streamed_rows_cover_the_whole_array():
+    rows = [{"id": str(i), "v": str(i)} for i in range(_TABLE_CHUNK + 100)]
+    rows[-1]["id"] = "A17"  # makes the id column text, after the first chunk
+    rows[-2]["v"] = "1.5"  # makes the v column floats
+    schema = scan_rows(iter(rows), "columns")
+    streamed = "".join(iter_toon_rows(iter(rows), indent=2, coerce="columns", schema=schema))
+    assert streamed == to_toon(rows, indent=2, coerce="columns")
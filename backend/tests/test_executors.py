@@ -0,0 +1,84 @@
+import asyncio
+import io
+import os
+import time
+
+import pytest
+
+from executors import ConversionExecutor, ExecutorBusy, ExecutorFailed, ExecutorTimeout
+from json_to_toon import Converter
+
+
+def test_timed_out_task_keeps_its_slot():
+    executor = ConversionExecutor("thread", workers=2, max_queue=1, timeout=0.05)
+    executor.start()
+
+    async def scenario():
+        with pytest.raises(ExecutorTimeout):
+            await executor.run_local(time.sleep, 0.3)
+        # the sleep is still running and holds the only slot
+        with pytest.raises(ExecutorBusy):
+            await executor.run_local(int, "1")
+        await asyncio.sleep(0.4)
+        assert await executor.run_local(int, "1") == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert executor._pending == 0
+
+
+def test_queue_depth_is_bounded():
+    executor = ConversionExecutor("thread", workers=1, max_queue=2)
+    executor.start()
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(executor.run_local(time.sleep, 0.1)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorBusy):
+            await executor.run_local(int, "1")
+        await asyncio.gather(*tasks)
+        assert await executor.run_local(int, "1") == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+
+def test_inline_mode_runs_on_the_loop():
+    executor = ConversionExecutor("inline")
+    executor.start()
+    converter = Converter()
+    expected = converter.convert('{"a": [1, 2]}', "json2toon")
+
+    async def scenario():
+        assert await executor.run(converter, '{"a": [1, 2]}', "json2toon") == expected
+        fp = io.BytesIO(b'{"a": [1, 2]}')
+        assert await executor.run_file(converter, fp, 13, "json2toon") == expected
+
+    asyncio.run(scenario())
+    assert executor._pending == 0
+
+
+def test_broken_process_pool_is_replaced():
+    executor = ConversionExecutor("process", workers=1, process_threshold=0)
+    executor.start()
+    converter = Converter()
+    text = '{"a": [1, 2]}'
+
+    async def scenario():
+        broken = executor._processes
+        with pytest.raises(ExecutorFailed):
+            await executor._call(broken, os._exit, 1)
+        assert executor._processes is not broken
+        assert await executor.run(converter, text, "json2toon") == converter.convert(text)
+        fp = io.BytesIO(text.encode())
+        assert await executor.run_file(converter, fp, len(text), "json2toon") == \
+            converter.convert(text)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
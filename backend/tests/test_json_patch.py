@@ -0,0 +1,113 @@
+import copy
+import json
+
+import pytest
+
+from json_to_toon import apply_json_patch
+
+# RFC 6902, Appendix A (A.13 is about duplicate JSON members, not patching)
+RFC_EXAMPLES = [
+    ({"foo": "bar"},
+     [{"op": "add", "path": "/baz", "value": "qux"}],
+     {"baz": "qux", "foo": "bar"}),
+    ({"foo": ["bar", "baz"]},
+     [{"op": "add", "path": "/foo/1", "value": "qux"}],
+     {"foo": ["bar", "qux", "baz"]}),
+    ({"baz": "qux", "foo": "bar"},
+     [{"op": "remove", "path": "/baz"}],
+     {"foo": "bar"}),
+    ({"foo": ["bar", "qux", "baz"]},
+     [{"op": "remove", "path": "/foo/1"}],
+     {"foo": ["bar", "baz"]}),
+    ({"baz": "qux", "foo": "bar"},
+     [{"op": "replace", "path": "/baz", "value": "boo"}],
+     {"baz": "boo", "foo": "bar"}),
+    ({"foo": {"bar": "baz", "waldo": "fred"}, "qux": {"corge": "grault"}},
+     [{"op": "move", "from": "/foo/waldo", "path": "/qux/thud"}],
+     {"foo": {"bar": "baz"}, "qux": {"corge": "grault", "thud": "fred"}}),
+    ({"foo": ["all", "grass", "cows", "eat"]},
+     [{"op": "move", "from": "/foo/1", "path": "/foo/3"}],
+     {"foo": ["all", "cows", "eat", "grass"]}),
+    ({"baz": "qux", "foo": ["a", 2, "c"]},
+     [{"op": "test", "path": "/baz", "value": "qux"},
+      {"op": "test", "path": "/foo/1", "value": 2}],
+     {"baz": "qux", "foo": ["a", 2, "c"]}),
+    ({"foo": "bar"},
+     [{"op": "add", "path": "/child", "value": {"grandchild": {}}}],
+     {"foo": "bar", "child": {"grandchild": {}}}),
+    ({"foo": "bar"},
+     [{"op": "add", "path": "/baz", "value": "qux", "xyz": 123}],
+     {"foo": "bar", "baz": "qux"}),
+    ({"/": 9, "~1": 10},
+     [{"op": "test", "path": "/~01", "value": 10}],
+     {"/": 9, "~1": 10}),
+    ({"foo": ["bar"]},
+     [{"op": "add", "path": "/foo/-", "value": ["abc", "def"]}],
+     {"foo": ["bar", ["abc", "def"]]}),
+]
+
+RFC_ERRORS = [
+    ({"baz": "qux"}, [{"op": "test", "path": "/baz", "value": "bar"}]),
+    ({"foo": "bar"}, [{"op": "add", "path": "/baz/bat", "value": "qux"}]),
+    ({"/": 9, "~1": 10}, [{"op": "test", "path": "/~01", "value": "10"}]),
+]
+
+
+@pytest.mark.parametrize("doc, patch, expected", RFC_EXAMPLES)
+def test_rfc_examples(doc, patch, expected):
+    before = copy.deepcopy(doc)
+    assert apply_json_patch(doc, patch) == expected
+    assert doc == before
+
+
+@pytest.mark.parametrize("doc, patch", RFC_ERRORS)
+def test_rfc_errors(doc, patch):
+    with pytest.raises(ValueError):
+        apply_json_patch(doc, patch)
+
+
+def test_unchanged_subtrees_are_shared():
+    doc = {"a": {"x": 1}, "b": {"y": [1, 2]}}
+    result = apply_json_patch(doc, [{"op": "replace", "path": "/a/x", "value": 2}])
+    assert result["b"] is doc["b"]
+    assert result["a"] is not doc["a"]
+    assert doc["a"] == {"x": 1}
+
+
+def test_copy_into_own_descendant():
+    doc = {"a": {"x": 1}}
+    result = apply_json_patch(doc, [
+        {"op": "replace", "path": "/a/x", "value": 2},
+        {"op": "copy", "from": "/a", "path": "/a/y"},
+    ])
+    assert result == {"a": {"x": 2, "y": {"x": 2}}}
+    assert result["a"]["y"] is not result["a"]
+    json.dumps(result)  # no cycle
+    assert doc == {"a": {"x": 1}}
+
+
+def test_copies_are_independent():
+    doc = {"a": {"x": [1]}}
+    result = apply_json_patch(doc, [
+        {"op": "copy", "from": "/a", "path": "/b"},
+        {"op": "add", "path": "/b/x/-", "value": 2},
+    ])
+    assert result == {"a": {"x": [1]}, "b": {"x": [1, 2]}}
+    assert doc == {"a": {"x": [1]}}
+
+
+@pytest.mark.parametrize("value, other", [
+    (True, 1), (True, 1.0), (False, 0), (1, True), (0.0, False),
+    ([1, True], [True, 1]), ({"a": [False]}, {"a": [0]}), ({"a": 1}, {"a": 1, "b": 2}),
+])
+def test_test_compares_json_types(value, other):
+    with pytest.raises(ValueError, match="Test failed"):
+        apply_json_patch({"v": value}, [{"op": "test", "path": "/v", "value": other}])
+
+
+@pytest.mark.parametrize("value, other", [
+    (1, 1.0), (True, True), (None, None), ({"a": [1, {"b": False}]}, {"a": [1.0, {"b": False}]}),
+])
+def test_test_accepts_equal_json_values(value, other):
+    doc = {"v": value}
+    assert apply_json_patch(doc, [{"op": "test", "path": "/v", "value": other}]) == doc
@@ -0,0 +1,150 @@
+import io
+import json
+import random
+import re
+
+import pytest
+
+from json_to_toon import (_SNIFF_BYTES, Converter, JsonStream, extract_roots, read_roots,
+                          select_roots, sniff_format)
+
+TRICKY = ["", "]", "}", "[{", '"', "\\", '\\"', "a\"b", "ü", "\u2028", "\n", "x" * 70]
+
+
+def random_value(rng, depth=0):
+    r = rng.random()
+    if depth > 4 or r < 0.4:
+        return rng.choice([0, -1.5, 1e300, 2**62, True, False, None, *TRICKY])
+    if r < 0.7:
+        return {rng.choice(TRICKY + ["a", "b", "c"]): random_value(rng, depth + 1)
+                for _ in range(rng.randint(0, 4))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+
+def random_arrays(seed, n=200):
+    rng = random.Random(seed)
+    return [[random_value(rng) for _ in range(rng.randint(0, 6))] for _ in range(n)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 1])
+def test_iter_values_matches_json_loads(chunk_size, indent):
+    for array in random_arrays(chunk_size):
+        data = json.dumps(array, indent=indent, ensure_ascii=False).encode()
+        stream = JsonStream(io.BytesIO(data), chunk_size)
+        assert list(stream.iter_values()) == array
+        stream.expect_end()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+def test_skip_value_keeps_position(chunk_size):
+    for array in random_arrays(3):
+        data = json.dumps(array).encode()
+        stream = JsonStream(io.BytesIO(data), chunk_size)
+        for i, _ in enumerate(stream.iter_array()):
+            if i % 2:
+                stream.skip_value()
+            else:
+                assert stream.read_value() == array[i]
+        stream.expect_end()
+
+
+@pytest.mark.parametrize("text", ["[1, 2", '{"a": }', "[1 2]", '"open', "[1] 2", "{'a': 1}"])
+def test_invalid_json(text):
+    stream = JsonStream(io.BytesIO(text.encode()))
+    with pytest.raises(ValueError):
+        stream.read_value()
+        stream.expect_end()
+
+
+def paths(value, prefix=()):
+    yield prefix
+    if isinstance(value, dict):
+        children = value.items()
+    elif isinstance(value, list):
+        children = [*enumerate(value), *((i - len(value), v) for i, v in enumerate(value))]
+    else:
+        return
+    for key, child in children:
+        if "." not in str(key) and key != "*":
+            yield from paths(child, (*prefix, str(key)))
+
+
+def test_select_roots_matches_extract_roots():
+    rng = random.Random(13)
+    for array in random_arrays(13, 100):
+        doc = {"a": array, "b": {"c": array[:2]}}
+        data = json.dumps(doc).encode()
+        candidates = [".".join(p) for p in paths(doc) if p and "" not in p]
+        candidates += ["a.*", "*.c", "a.*.b", "b.c.*.*", "zz", "a.99", "a.-99"]
+        for _ in range(5):
+            roots = rng.sample(candidates, min(3, len(candidates)))
+            try:
+                expected = extract_roots(doc, roots)
+            except KeyError as e:
+                with pytest.raises(KeyError, match=re.escape(str(e))):
+                    read_roots(io.BytesIO(data), roots, chunk_size=16)
+                continue
+            assert read_roots(io.BytesIO(data), roots, chunk_size=16) == expected
+            stream = JsonStream(io.BytesIO(data), 16)
+            assert select_roots(stream, roots) == expected
+
+
+@pytest.mark.parametrize("head, fmt", [
+    (b'{"a": 1}', "json"),
+    (b'{"a": 1}\n{"a": 2}\n', "ndjson"),
+    (b'\xef\xbb\xbf  [1]\r\n[2]', "ndjson"),
+    (b'{"a": 1}\n', "json"),
+    (b'\x1e{"a": 1}\n\x1e{"a": 2}\n', "json-seq"),
+    (b'{"a": [1, 2', "json"),
+])
+def test_sniff_format(head, fmt):
+    assert sniff_format(head) == fmt
+
+
+class Pipe(io.RawIOBase):
+    """Unbuffered reader returning at most `step` bytes per read, like a
+    pipe."""
+
+    def __init__(self, data: bytes, step: int = 4096):
+        self.data = memoryview(data)
+        self.step = step
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self.step, len(self.data))
+        b[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+def long_first_record():
+    records = [{"id": i, "blob": "x" * (2 * _SNIFF_BYTES if i == 0 else 1),
+                "n": {"k": i}} for i in range(4)]
+    return "\n".join(map(json.dumps, records)) + "\n"
+
+
+@pytest.mark.parametrize("reader", [io.BytesIO, Pipe, lambda b: io.BufferedReader(Pipe(b), 8192)])
+@pytest.mark.parametrize("root", [None, "0.id", "2.n", "*.n.k", "-1"])
+def test_ndjson_with_long_first_record(reader, root):
+    text = long_first_record()
+    converter = Converter(root=root)
+    expected = converter.json2toon(text)
+    assert "".join(converter.iter_json2toon_stream(reader(text.encode()))) == expected
+    assert "".join(converter.iter_json2toon_file(io.BytesIO(text.encode()))) == expected
+
+
+def test_ndjson_roots_with_long_first_record():
+    text = long_first_record()
+    converter = Converter()
+    roots = ["0.id", "3.n"]
+    streamed = converter.iter_json2toon_roots_stream(Pipe(text.encode()), roots)
+    assert {r: "".join(c) for r, c in streamed.items()} == converter.json2toon_roots(text, roots)
+
+
+def test_explicit_json_format_rejects_records():
+    converter = Converter(input_format="json")
+    with pytest.raises(ValueError, match="Extra data"):
+        "".join(converter.iter_json2toon_stream(io.BytesIO(long_first_record().encode())))
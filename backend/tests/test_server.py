@@ -0,0 +1,94 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture
+def client():
+    server.sessions.clear()
+    with TestClient(server.app) as client:
+        yield client
+
+
+def late_key_rows(n=6000, late=4500):
+    """Rows where a new key (and a non-numeric value) first shows up after
+    the first table chunk."""
+    rows = [{"id": i, "code": str(i)} for i in range(n)]
+    rows[late]["extra"] = "x"
+    rows[late]["code"] = "A17"
+    return json.dumps(rows).encode()
+
+
+def upload(body, **form):
+    return {"files": {"file": ("rows.json", body, "application/json")},
+            "data": {"mode": "json2toon", **form}}
+
+
+@pytest.mark.parametrize("coerce", [None, "values", "columns"])
+def test_stream_upload_matches_convert(client, coerce):
+    form = {"coerce": coerce} if coerce else {}
+    body = late_key_rows()
+    converted = client.post("/api/convert", **upload(body, **form)).json()
+    assert converted["ok"]
+    streamed = client.post("/api/convert/stream", **upload(body, **form))
+    assert streamed.status_code == 200
+    assert streamed.text == converted["content"]
+    assert "extra" in streamed.text.split("\n", 1)[0]
+
+
+def new_session(client, doc):
+    response = client.post("/api/sessions", data={"text": json.dumps(doc)})
+    assert response.json()["ok"]
+    return response.json()["session"]
+
+
+def put(client, sid, doc):
+    return client.put(f"/api/sessions/{sid}", data={"text": json.dumps(doc)})
+
+
+def test_sessions_share_a_byte_budget(client, monkeypatch):
+    doc = {"rows": [{"id": i, "name": f"n{i}"} for i in range(200)]}
+    first = new_session(client, doc)
+    size = server.sessions[first].size
+    monkeypatch.setattr(server, "MAX_SESSION_BYTES", size * 2 + size // 2)
+    second = new_session(client, doc)
+    third = new_session(client, doc)
+    assert first not in server.sessions
+    assert put(client, first, doc).status_code == 404
+    assert put(client, second, doc).status_code == 200
+    # a patch adds its size to the session's
+    patch = [{"op": "add", "path": "/rows/-", "value": {"id": -1, "name": "x" * size}}]
+    assert client.patch(f"/api/sessions/{third}", json=patch).json()["ok"]
+    assert server.sessions[third].size > 2 * size
+    assert list(server.sessions) == [third]
+
+
+def test_idle_sessions_expire(client, monkeypatch):
+    sid = new_session(client, {"a": 1})
+    assert put(client, sid, {"a": 2}).status_code == 200
+    monkeypatch.setattr(server, "SESSION_TTL", 0.0)
+    assert put(client, sid, {"a": 3}).status_code == 404
+
+
+def test_session_calls_go_through_the_executor(client, monkeypatch):
+    executor = server.ConversionExecutor("thread", workers=1, timeout=0.05)
+    executor.start()
+    monkeypatch.setattr(server, "executor", executor)
+    try:
+        sid = new_session(client, {"a": 1})
+        update_now = server.EditSession.update
+
+        def update(session, text):
+            time.sleep(0.3)
+            return update_now(session, text)
+
+        monkeypatch.setattr(server.EditSession, "update", update)
+        assert put(client, sid, {"a": 2}).status_code == 504
+        # the timed-out call may still change the session, so it is gone
+        assert sid not in server.sessions
+    finally:
+        executor.shutdown()
@@ -0,0 +1,102 @@
+import io
+import json
+import random
+
+import pytest
+
+from json_to_toon import ToonDecoder, extract_root, to_toon, toon_to_json
+
+SCALARS = [0, 1, -7, 2.5, -0.125, 1e20, True, False, None, "", "x", "a b", "1", "true",
+           "null", "-", "a,b", "a|b", "a\tb", 'q"uote', "back\\slash", "new\nline",
+           "ünï", "[1]", "{x}", " pad ", 2**70, -2**65]
+
+
+def random_value(rng, depth=0):
+    """A document `to_toon` round-trips: table rows share their keys, and
+    other lists start with a scalar so they are never tables."""
+    r = rng.random()
+    if depth > 3 or r < 0.4:
+        return rng.choice(SCALARS)
+    if r < 0.6:
+        return {rng.choice("abcde") + str(i): random_value(rng, depth + 1)
+                for i in range(rng.randint(0, 4))}
+    if r < 0.8:
+        keys = [f"k{i}" for i in range(rng.randint(1, 4))]
+        return [{k: rng.choice(SCALARS) for k in keys} for _ in range(rng.randint(1, 5))]
+    return [rng.choice(SCALARS)] + [random_value(rng, depth + 1)
+                                    for _ in range(rng.randint(0, 3))]
+
+
+def random_docs(seed, n=300):
+    rng = random.Random(seed)
+    return [{"root": random_value(rng), "n": rng.choice(SCALARS)} for _ in range(n)]
+
+
+@pytest.mark.parametrize("delimiter", [",", "\t", "|"])
+@pytest.mark.parametrize("length_marker", [False, True])
+@pytest.mark.parametrize("indent", [2, 4])
+def test_round_trip(delimiter, length_marker, indent):
+    for doc in random_docs(indent):
+        text = to_toon(doc, indent=indent, delimiter=delimiter, length_marker=length_marker)
+        assert toon_to_json(text) == doc
+        # read line by line, as for a file
+        assert ToonDecoder(io.StringIO(text)).decode() == doc
+
+
+@pytest.mark.parametrize("indent, ensure_ascii", [(None, False), (2, False), (2, True)])
+def test_iter_json_matches_json_dumps(indent, ensure_ascii):
+    for doc in random_docs(7, 100):
+        text = to_toon(doc, indent=2, length_marker=True)
+        streamed = "".join(ToonDecoder(text.splitlines()).iter_json(indent, ensure_ascii))
+        assert streamed == json.dumps(doc, indent=indent, ensure_ascii=ensure_ascii)
+
+
+def paths(value, prefix=""):
+    yield prefix
+    if isinstance(value, dict):
+        children = value.items()
+    elif isinstance(value, list):
+        children = enumerate(value)
+    else:
+        return
+    for key, child in children:
+        yield from paths(child, f"{prefix}.{key}" if prefix else str(key))
+
+
+@pytest.mark.parametrize("length_marker", [False, True])
+def test_decode_path_matches_extract_root(length_marker):
+    for doc in random_docs(11, 100):
+        text = to_toon(doc, indent=2, length_marker=length_marker)
+        for path in list(paths(doc))[1:]:
+            assert toon_to_json(text, root=path) == extract_root(doc, path)
+
+
+@pytest.mark.parametrize("root", ["root.zz", "n.x", "root.99"])
+def test_decode_path_missing(root):
+    text = to_toon({"root": {"a": [1, 2]}, "n": 1}, indent=2, length_marker=True)
+    with pytest.raises(KeyError, match="Invalid root path"):
+        toon_to_json(text, root=root)
+
+
+def test_wide_ints_stay_exact():
+    doc = {"big": 2**70, "neg": -2**65, "row": [{"a": 10**30, "b": "12345678901234567890123"}],
+           "list": [1, 2**64, 3.5]}
+    text = to_toon(doc, indent=2)
+    assert toon_to_json(text) == doc
+    assert type(toon_to_json(text)["big"]) is int
+
+
+# blank lines inside blocks that carry a length marker
+BLANK_LINES = [
+    "a[3,]:\n  - 1\n\n  - 2\n  - 3\nb: 5",
+    "a[3,]:\n  {x}:\n    1\n\n    2\n   \n    3\nb: 5",
+    "a[2,]:\n  - 1\n\n\n  - 2\nb: 5",
+]
+
+
+@pytest.mark.parametrize("text", BLANK_LINES)
+def test_path_skips_blank_lines_like_decode(text):
+    doc = toon_to_json(text)
+    for i, item in enumerate(doc["a"]):
+        assert toon_to_json(text, root=f"a.{i}") == item
+    assert toon_to_json(text, root="b") == doc["b"] == 5
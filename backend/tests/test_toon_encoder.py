@@ -0,0 +1,118 @@
+import json
+import random
+import threading
+
+import pytest
+
+from json_to_toon import (Converter, FragmentMemo, TablePool, iter_ndjson_toon, iter_toon,
+                          iter_toon_rows, to_toon)
+
+CELLS = [0, -3, 2.5, 1e20, True, None, "", "x", "a,b", "a|b", "1", "null", "ü", [1, "a"],
+         {"k": [None]}]
+
+
+def random_rows(rng, n):
+    keys = [f"k{i}" for i in range(rng.randint(1, 5))]
+    rows = [{k: rng.choice(CELLS) for k in keys if rng.random() < 0.9} for _ in range(n)]
+    return rows
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with TablePool(2, chunk_rows=7) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize("coerce", [False, True, "columns"])
+@pytest.mark.parametrize("delimiter", [",", "|"])
+def test_parallel_tables_match_serial(pool, coerce, delimiter):
+    rng = random.Random(19)
+    for n in (0, 1, 6, 7, 8, 50):
+        doc = {"t": random_rows(rng, n), "nested": {"t": random_rows(rng, n)}}
+        serial = to_toon(doc, indent=2, delimiter=delimiter, coerce=coerce)
+        assert to_toon(doc, indent=2, delimiter=delimiter, coerce=coerce, pool=pool) == serial
+        rows = "".join(iter_toon_rows(iter(doc["t"]), indent=2, delimiter=delimiter,
+                                      coerce=coerce, pool=pool))
+        assert rows == to_toon(doc["t"], indent=2, delimiter=delimiter, coerce=coerce)
+
+
+def test_chunks_join_to_to_toon():
+    rng = random.Random(3)
+    doc = {"t": random_rows(rng, 40), "l": list(range(30)), "o": {"a": {"b": 1}}}
+    for chunk_lines in (1, 4, 1024):
+        chunks = list(iter_toon(doc, indent=2, chunk_lines=chunk_lines))
+        assert "".join(chunks) == to_toon(doc, indent=2)
+
+
+@pytest.mark.parametrize("coerce", [False, True, "columns"])
+@pytest.mark.parametrize("length_marker", [False, True])
+def test_parallel_ndjson_matches_json2toon(tmp_path, pool, coerce, length_marker):
+    rng = random.Random(20)
+    rows = random_rows(rng, 60)
+    rows[45]["late"] = "1"  # a key first seen in a later range
+    path = tmp_path / "rows.ndjson"
+    text = "\n".join(map(json.dumps, rows)) + "\n\n"
+    path.write_text(text)
+    expected = Converter(coerce=coerce, length_marker=length_marker).json2toon(text)
+    got = "".join(iter_ndjson_toon(str(path), pool, indent=2, coerce=coerce,
+                                   length_marker=length_marker, range_size=64))
+    assert got == expected
+
+
+def test_parallel_ndjson_reports_the_bad_line(tmp_path, pool):
+    path = tmp_path / "bad.ndjson"
+    path.write_text('{"a": 1}\n' * 20 + "{oops\n" + '{"a": 2}\n')
+    with pytest.raises(ValueError, match="line 21"):
+        "".join(iter_ndjson_toon(str(path), pool, indent=2, range_size=32))
+
+
+def repeated_doc(rng):
+    shared = {"cfg": {"a": [1, 2, 3], "b": {"c": "x" * 50}}, "rows": random_rows(rng, 5)}
+    return {"items": [dict(shared, id=i) if i % 2 else shared for i in range(20)],
+            "again": shared}
+
+
+def test_memo_output_matches_plain_encoding():
+    rng = random.Random(22)
+    memo = FragmentMemo()
+    for _ in range(20):
+        doc = repeated_doc(rng)
+        assert to_toon(doc, indent=2, memo=memo) == to_toon(doc, indent=2)
+    stats = memo.stats()
+    assert stats["hits"] and stats["saved"]
+    assert stats["bytes"] <= memo.max_bytes
+
+
+def test_memo_evicts_to_its_budget():
+    rng = random.Random(23)
+    memo = FragmentMemo(max_bytes=2000)
+    for _ in range(20):
+        doc = repeated_doc(rng)
+        assert to_toon(doc, indent=2, memo=memo) == to_toon(doc, indent=2)
+        assert memo.bytes <= 2000
+    held = sum(len(fp) + size for (_, fp), (_, size) in memo._fragments.items())
+    assert memo.bytes == held
+
+
+def test_memo_shared_between_threads():
+    rng = random.Random(24)
+    docs = [repeated_doc(rng) for _ in range(6)]
+    expected = [to_toon(doc, indent=2) for doc in docs]
+    memo = FragmentMemo(max_bytes=4000)
+    errors = []
+
+    def encode(doc, text):
+        try:
+            for _ in range(10):
+                assert to_toon(doc, indent=2, memo=memo) == text
+        except Exception as e:  # reported by the main thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=encode, args=pair) for pair in zip(docs, expected)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    held = sum(len(fp) + size for (_, fp), (_, size) in memo._fragments.items())
+    assert memo.bytes == held <= 4000